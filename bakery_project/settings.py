@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'cart.middleware.CartMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -68,6 +69,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'cart.context_processors.cart', # <--- Наш контекстный процессор
+                'catalog.context_processors.category_tree',
             ],
         },
     },
@@ -87,6 +89,49 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The web processes and run_order_worker must share the cache: the worker's
+# restocks evict products and bump the catalog version. With REDIS_URL set
+# (needs the redis package) both aliases live in Redis. Without it, the page
+# caches (sidebar, cards, products, facets) stay in each process's memory and
+# only the small version counters are shared, through a database table. Each
+# process re-reads them at most every CACHE_VERSION_POLL_INTERVAL seconds, so
+# a change made in another process shows up that much later. Product entries
+# are evicted by id in the process that changed them; without Redis the other
+# processes serve their copy until it expires (PRODUCT_CACHE_TIMEOUT), which
+# is why carts re-price from the database. CacheCartStorage
+# needs Redis, since carts in one process's memory are lost to the others.
+
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+        'versions': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+        # Created by migrate (catalog 0008) or `manage.py createcachetable`.
+        'versions': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        },
+    }
+# Seconds a process trusts the version counters it last read before asking the shared cache again.
+CACHE_VERSION_POLL_INTERVAL = 1.0
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -135,4 +180,47 @@ MEDIA_ROOT = BASE_DIR / 'media' # Папка для загружаемых ме
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-CART_SESSION_ID = 'cart'
\ No newline at end of file
+CART_SESSION_ID = 'cart'
+# One of cart.storage.SessionCartStorage, SignedCookieCartStorage or CacheCartStorage.
+CART_STORAGE = 'cart.storage.SessionCartStorage'
+CART_COOKIE_NAME = 'cart'
+CART_COOKIE_AGE = 60 * 60 * 24 * 14
+# Seconds a cart holds the stock it added before others may buy it.
+CART_RESERVATION_TTL = 60 * 15
+
+# Order event outbox, drained by manage.py run_order_worker.
+ORDER_OUTBOX_BATCH_SIZE = 100
+ORDER_OUTBOX_MAX_ATTEMPTS = 5
+ORDER_OUTBOX_BACKOFF = 5  # seconds, doubled after every failed attempt
+ORDER_OUTBOX_LEASE = 60  # seconds a claimed batch is hidden from other workers
+ORDER_WORKER_CONCURRENCY = 4
+# Rows per page of the staff order list.
+ORDER_ADMIN_PAGE_SIZE = 50
+# Rows fetched per round trip by the streaming order export.
+ORDER_EXPORT_CHUNK_SIZE = 2000
+
+CATALOG_PAGE_SIZE = 24
+# Read-through product lookups: per-process LRU in front of the shared cache.
+PRODUCT_CACHE_LRU_SIZE = 1024
+PRODUCT_CACHE_LRU_TTL = 5  # seconds
+PRODUCT_CACHE_TIMEOUT = 60 * 5
+# Lower bounds of the price facet buckets; the last bucket is open-ended.
+CATALOG_PRICE_BUCKETS = (0, 5, 10, 20, 50)
+# Rendered product cards are keyed by updated_at, so the timeout only bounds memory use.
+PRODUCT_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Resized copies generated for every product image, see services.image_derivatives.
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 1024)
+IMAGE_DERIVATIVE_WORKERS = 2
+
+# Send the services' INFO messages (e.g. export throughput) to the console.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'services': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
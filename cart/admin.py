@@ -1,3 +1,10 @@
 from django.contrib import admin
+from .models import StockReservation
 
-# Register your models here.
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['product', 'cart_token', 'quantity', 'expires_at']
+    list_select_related = ['product']
+    raw_id_fields = ['product']
+    search_fields = ['cart_token']
@@ -1,77 +1,200 @@
+import secrets
+from contextlib import contextmanager
+from dataclasses import dataclass
 from decimal import Decimal
-from django.conf import settings
 from catalog.models import Product
+from services.cache_versions import get_version, PRICE_VERSION
+from services.product_cache import get_products
+from .storage import CartHeader, CartItem, CartSummary, decode_items, encode_cart, get_cart_storage, split_cart, to_cents
+
+
+@dataclass(frozen=True)
+class CartLine:
+    """A hydrated, read-only cart line."""
+    product: Product
+    quantity: int
+    price: Decimal
+
+    @property
+    def product_id(self):
+        return self.product.id
+
+    @property
+    def total_price(self):
+        return self.price * self.quantity
 
 
 class Cart:
     def __init__(self, request):
         """
-        Initialize the cart.
+        Initialize the cart from the configured storage backend. Only the
+        summary is read here; items are decoded on first use.
         """
-        self.session = request.session
-        cart_data = self.session.get(settings.CART_SESSION_ID)
-        if not cart_data:
-            cart_data = self.session[settings.CART_SESSION_ID] = {}
-        self.cart_data = cart_data
+        self.storage = get_cart_storage(request)
+        header, self._payload = split_cart(self.storage.load())
+        self._summary, self.price_version, self._token = header
+        self._items = None
+        self._lines = None
+        self._batching = False
+
+    @property
+    def items(self):
+        if self._items is None:
+            self._items = decode_items(self._payload)
+            self._payload = None
+            self.verify()
+        return self._items
+
+    @property
+    def summary(self):
+        """
+        Item count, line count and subtotal, read without decoding the items.
+        """
+        if self._summary is None:
+            self._summary = CartSummary.from_items(self.items)
+        return self._summary
+
+    @property
+    def token(self):
+        """
+        Opaque id of this cart, created on first use; stock reservations are
+        held under it.
+        """
+        if not self._token:
+            self._token = secrets.token_urlsafe(12)
+        return self._token
+
+    def verify(self):
+        """
+        Check the stored summary against the items and repair it when they
+        disagree. Returns True when the summary was already consistent.
+        """
+        actual = CartSummary.from_items(self.items)
+        if self._summary == actual:
+            return True
+        self._summary = actual
+        self.save()
+        return False
 
     def add(self, product, quantity=1, update_quantity=False):
         """
         Add a product to the cart or update its quantity.
         """
-        product_id = str(product.id)
-        if product_id not in self.cart_data:
-            self.cart_data[product_id] = {'quantity': 0, 'price': str(product.price)}
-
-        if update_quantity:
-            self.cart_data[product_id]['quantity'] = quantity
-        else:
-            self.cart_data[product_id]['quantity'] += quantity
+        if not self.items:
+            self.price_version = get_version(PRICE_VERSION)
+        item = self.items.get(product.id) or CartItem(0, to_cents(product.price))
+        new_quantity = quantity if update_quantity else item.quantity + quantity
 
-        if self.cart_data[product_id]['quantity'] <= 0:
+        if new_quantity <= 0:
             self.remove(product)
         else:
+            self.items[product.id] = item._replace(quantity=new_quantity)
+            self._apply(item, new_quantity)
             self.save()
 
+    def _apply(self, item, new_quantity):
+        """
+        Move the summary by the difference between item and its new quantity.
+        """
+        delta = new_quantity - item.quantity
+        line_delta = (new_quantity > 0) - (item.quantity > 0)
+        summary = self.summary
+        self._summary = CartSummary(
+            item_count=summary.item_count + delta,
+            line_count=summary.line_count + line_delta,
+            subtotal_cents=summary.subtotal_cents + delta * item.price_cents,
+        )
+
     def save(self):
-        self.session.modified = True
+        self._lines = None
+        if not self._batching:
+            self.storage.save(encode_cart(self.items, CartHeader(self.summary, self.price_version, self._token)))
+
+    @contextmanager
+    def batch(self):
+        """
+        Apply several changes and persist them once on exit. If the block
+        raises, every change made inside it is discarded.
+        """
+        items, summary, price_version = dict(self.items), self.summary, self.price_version
+        self._batching = True
+        try:
+            yield self
+        except Exception:
+            self._items, self._summary, self.price_version = items, summary, price_version
+            self._lines = None
+            raise
+        finally:
+            self._batching = False
+        self.save()
 
     def remove(self, product):
         """
         Remove a product from the cart.
         """
-        product_id = str(product.id)
-        if product_id in self.cart_data:
-            del self.cart_data[product_id]
+        item = self.items.pop(product.id, None)
+        if item is not None:
+            self._apply(item, 0)
             self.save()
 
-    def __iter__(self):
+    @property
+    def lines(self):
         """
-        Iterate over the items in the cart and get the products
-        from the database.
+        Cart lines with their products, hydrated with a single lookup on first
+        access and reused until the cart changes.
         """
-        product_ids = self.cart_data.keys()
-        products = Product.objects.filter(id__in=product_ids)
-        cart = self.cart_data.copy()
+        if self._lines is None:
+            self._lines = self._build_lines(get_products(self.items.keys()))
+        return self._lines
 
-        for product in products:
-            cart[str(product.id)]['product_obj'] = product
+    def _build_lines(self, products):
+        return [
+            CartLine(product=products[product_id], quantity=item.quantity, price=item.price)
+            for product_id, item in self.items.items()
+            if product_id in products
+        ]
 
-        for item in cart.values():
-            item['price'] = Decimal(item['price'])
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
+    def refresh_prices(self):
+        """
+        Re-price the lines from the current products if any catalog price
+        changed since the cart was priced; otherwise this is a single version
+        comparison. Returns (line, old_price) for every line whose price moved.
+        """
+        current = get_version(PRICE_VERSION)
+        if self.price_version == current or not self:
+            return []
+
+        # Prices come from the database: a cached product may predate the change that moved the version.
+        prices = dict(Product.objects.filter(pk__in=list(self.items)).values_list('id', 'price'))
+        old_prices = {}
+        for product_id, price in prices.items():
+            item = self.items[product_id]
+            price_cents = to_cents(price)
+            if item.price_cents != price_cents:
+                old_prices[product_id] = item.price
+                self.items[product_id] = item._replace(price_cents=price_cents)
+        self._summary = CartSummary.from_items(self.items)
+        self.price_version = current
+        self.save()
+        return [(line, old_prices[line.product_id]) for line in self.lines if line.product_id in old_prices]
+
+    def __iter__(self):
+        return iter(self.lines)
 
     def __len__(self):
         """
         Count all items in the cart.
         """
-        return sum(item['quantity'] for item in self.cart_data.values())
+        return self.summary.item_count
 
     def get_total_price(self):
-        return sum(Decimal(item['price']) * item['quantity'] for item in self.cart_data.values())
+        return self.summary.subtotal
 
     def clear(self):
-        del self.session[settings.CART_SESSION_ID]
+        self._items = {}
+        self._payload = None
+        self._summary = CartSummary()
+        self._token = ''
         self.save()
 
     def get_item(self, product_id):
@@ -79,7 +202,15 @@ class Cart:
         Get a specific item from the cart by product_id.
         Returns None if item not found.
         """
-        product_id_str = str(product_id)
-        if product_id_str in self.cart_data:
-            return self.cart_data[product_id_str]
-        return None
\ No newline at end of file
+        return self.items.get(int(product_id))
+
+
+def get_cart(request):
+    """
+    The cart of this request, created once and shared by the middleware, views,
+    services and context processors that ask for it.
+    """
+    cart = getattr(request, '_cart', None)
+    if cart is None:
+        cart = request._cart = Cart(request)
+    return cart
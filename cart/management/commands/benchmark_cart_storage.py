@@ -0,0 +1,73 @@
+import json
+import time
+from decimal import Decimal
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from cart.cart import Cart
+from catalog.models import Product
+
+BACKENDS = [
+    'cart.storage.SessionCartStorage',
+    'cart.storage.SignedCookieCartStorage',
+    'cart.storage.CacheCartStorage',
+]
+
+
+class Command(BaseCommand):
+    help = "Compare bytes written and latency per cart-mutating request across cart storage backends."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--lines', type=int, default=10, help="Distinct products cycled through the cart.")
+
+    def _run(self, backend, requests, lines):
+        factory = RequestFactory()
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+        products = [Product(id=1000 + i, price=Decimal('3.75') + i) for i in range(lines)]
+        cookies, session_key = {}, None
+        total_bytes, elapsed = 0, 0.0
+
+        with override_settings(CART_STORAGE=backend):
+            for i in range(requests):
+                request = factory.post('/cart/add/')
+                request.COOKIES.update(cookies)
+                request.session = session_store(session_key)
+                response = HttpResponse()
+
+                started = time.perf_counter()
+                cart = Cart(request)
+                cart.add(products[i % lines], quantity=1)
+                cart.storage.process_response(response)
+                if request.session.modified:
+                    request.session.save()
+                elapsed += time.perf_counter() - started
+
+                session_key = request.session.session_key
+                for name, morsel in response.cookies.items():
+                    cookies[name] = morsel.value
+                    total_bytes += len(morsel.value)
+                if request.session.modified:
+                    total_bytes += len(request.session.encode(dict(request.session.items())))
+                elif backend.endswith('CacheCartStorage'):
+                    total_bytes += len(cart.storage._pending or '')
+
+            if session_key:
+                session_store(session_key).delete()
+        return total_bytes / requests, elapsed / requests * 1000
+
+    def handle(self, *args, **options):
+        requests, lines = options['requests'], options['lines']
+        legacy = {str(1000 + i): {'quantity': requests // lines, 'price': str(Decimal('3.75') + i)}
+                  for i in range(lines)}
+        self.stdout.write(f"{requests} add-to-cart requests over {lines} products "
+                          f"(legacy JSON cart payload: {len(json.dumps(legacy))} bytes)")
+        self.stdout.write(f"{'backend':<42}{'bytes/request':>15}{'ms/request':>12}")
+        for backend in BACKENDS:
+            size, latency = self._run(backend, requests, lines)
+            self.stdout.write(f"{backend:<42}{size:>15.0f}{latency:>12.3f}")
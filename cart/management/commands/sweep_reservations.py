@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from services.inventory import sweep_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Delete expired cart stock reservations in batches. Safe to run from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = sweep_expired_reservations(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Expired reservations deleted: {deleted}."))
@@ -0,0 +1,21 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cart import get_cart
+
+
+class CartMiddleware:
+    """
+    Attach a lazily created, request-scoped ``request.cart`` and let its storage
+    backend flush the (coalesced) cart write into the response.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.cart = SimpleLazyObject(lambda: get_cart(request))
+        response = self.get_response(request)
+        cart = getattr(request, '_cart', None)
+        if cart is not None:
+            cart.storage.process_response(response)
+        return response
@@ -1,3 +1,28 @@
 from django.db import models
+from catalog.models import Product
 
-# Create your models here.
+
+class StockReservation(models.Model):
+    """
+    Quantity of a product held for one cart until ``expires_at``. Available to
+    sell is ``stock`` minus the unexpired reservations, see services.inventory.
+    """
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE)
+    cart_token = models.CharField(max_length=32)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Stock Reservation'
+        verbose_name_plural = 'Stock Reservations'
+        constraints = [
+            models.UniqueConstraint(fields=['cart_token', 'product'], name='cart_reservation_unique'),
+        ]
+        indexes = [
+            # Covers the per-product SUM(quantity) over unexpired rows.
+            models.Index(fields=['product', 'expires_at', 'quantity'], name='cart_reservation_active_idx'),
+            models.Index(fields=['expires_at'], name='cart_reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_id} for {self.cart_token}'
@@ -0,0 +1,213 @@
+import secrets
+from abc import ABC, abstractmethod
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+ENCODING_VERSION = '4'
+CENTS = Decimal('0.01')
+
+
+class CartItem(NamedTuple):
+    quantity: int
+    price_cents: int
+
+    @property
+    def price(self) -> Decimal:
+        return from_cents(self.price_cents)
+
+
+class CartSummary(NamedTuple):
+    """Denormalized totals kept next to the items so headers never decode them."""
+    item_count: int = 0
+    line_count: int = 0
+    subtotal_cents: int = 0
+
+    @property
+    def subtotal(self) -> Decimal:
+        return from_cents(self.subtotal_cents)
+
+    @classmethod
+    def from_items(cls, items: dict) -> 'CartSummary':
+        return cls(
+            item_count=sum(item.quantity for item in items.values()),
+            line_count=len(items),
+            subtotal_cents=sum(item.quantity * item.price_cents for item in items.values()),
+        )
+
+
+class CartHeader(NamedTuple):
+    """Everything stored ahead of the items. summary is None when it must be re-derived."""
+    summary: Optional[CartSummary] = CartSummary()
+    price_version: Optional[int] = None
+    token: str = ''
+
+
+def to_cents(price) -> int:
+    return int((Decimal(price) / CENTS).to_integral_value())
+
+
+def from_cents(cents: int) -> Decimal:
+    return (Decimal(cents) * CENTS).quantize(CENTS)
+
+
+def encode_cart(items: dict, header: CartHeader) -> str:
+    """
+    -> "4;Xk2f9q;1712345678901;7.2.1749;12.3.450,15.1.1299"
+    Format version, the cart token, the catalog price version the lines were
+    priced at, the summary (items.lines.subtotal cents), then one
+    id.quantity.cents triple per line. Integers only apart from the token:
+    no JSON keys and no repeated field names or price strings.
+    """
+    if not items:
+        return ''
+    summary = header.summary
+    packed = ','.join(f'{pk}.{item.quantity}.{item.price_cents}' for pk, item in items.items())
+    return (f'{ENCODING_VERSION};{header.token};{header.price_version or 0};'
+            f'{summary.item_count}.{summary.line_count}.{summary.subtotal_cents};{packed}')
+
+
+def split_cart(data):
+    """
+    Split stored data into (CartHeader, undecoded items payload) without
+    touching the items. Older formats lack the token and price version, and
+    version 1 strings and legacy session dicts lack the summary as well.
+    """
+    if not data:
+        return CartHeader(), ''
+    if isinstance(data, dict):
+        return CartHeader(summary=None), data
+    try:
+        version, rest = data.split(';', 1)
+        if version == '1':
+            return CartHeader(summary=None), rest
+        token, price_version = '', None
+        if version == ENCODING_VERSION:
+            token, rest = rest.split(';', 1)
+        if version in ('3', ENCODING_VERSION):
+            price_version, rest = rest.split(';', 1)
+            price_version = int(price_version) or None
+        elif version != '2':
+            raise ValueError(version)
+        summary, packed = rest.split(';', 1)
+        summary = CartSummary(*(int(part) for part in summary.split('.')))
+        return CartHeader(summary, price_version, token), packed
+    except (AttributeError, TypeError, ValueError):
+        return CartHeader(), ''
+
+
+def decode_items(payload) -> dict:
+    """The items part of split_cart() as {product_id: CartItem}; also accepts legacy dicts."""
+    if not payload:
+        return {}
+    try:
+        if isinstance(payload, dict):
+            return {int(pk): CartItem(int(item['quantity']), to_cents(item['price']))
+                    for pk, item in payload.items()}
+        items = {}
+        for chunk in filter(None, payload.split(',')):
+            pk, quantity, price_cents = (int(part) for part in chunk.split('.'))
+            if quantity > 0 and price_cents >= 0:
+                items[pk] = CartItem(quantity, price_cents)
+        return items
+    except (AttributeError, KeyError, TypeError, ValueError, ArithmeticError):
+        return {}
+
+
+class BaseCartStorage(ABC):
+    """
+    Where the encoded cart lives between requests. ``save`` may buffer the write;
+    ``process_response`` is called once by CartMiddleware to flush it, so several
+    cart mutations in one request cost a single write.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    @abstractmethod
+    def load(self) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def save(self, data: str) -> None:
+        pass
+
+    def process_response(self, response) -> None:
+        pass
+
+
+class SessionCartStorage(BaseCartStorage):
+    def load(self):
+        return self.request.session.get(settings.CART_SESSION_ID)
+
+    def save(self, data):
+        session = self.request.session
+        if data:
+            session[settings.CART_SESSION_ID] = data
+        else:
+            session.pop(settings.CART_SESSION_ID, None)
+        session.modified = True
+
+
+class _BufferedCartStorage(BaseCartStorage):
+    def __init__(self, request):
+        super().__init__(request)
+        self._pending = None
+
+    def save(self, data):
+        self._pending = data
+
+
+class SignedCookieCartStorage(_BufferedCartStorage):
+    """The whole cart in a signed cookie: no server-side state at all."""
+    salt = 'cart.storage.cookie'
+
+    def load(self):
+        return self.request.get_signed_cookie(settings.CART_COOKIE_NAME, default=None, salt=self.salt,
+                                              max_age=settings.CART_COOKIE_AGE)
+
+    def process_response(self, response):
+        if self._pending is None:
+            return
+        if self._pending:
+            response.set_signed_cookie(settings.CART_COOKIE_NAME, self._pending, salt=self.salt,
+                                       max_age=settings.CART_COOKIE_AGE, httponly=True, samesite='Lax')
+        else:
+            response.delete_cookie(settings.CART_COOKIE_NAME, samesite='Lax')
+
+
+class CacheCartStorage(_BufferedCartStorage):
+    """The cart in Django's cache, addressed by a random id kept in a cookie."""
+    key_template = 'cart:{cart_id}'
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.cart_id = request.COOKIES.get(settings.CART_COOKIE_NAME)
+        self._new_id = False
+
+    def load(self):
+        if not self.cart_id:
+            return None
+        return cache.get(self.key_template.format(cart_id=self.cart_id))
+
+    def process_response(self, response):
+        if self._pending is None:
+            return
+        if not self._pending:
+            if self.cart_id:
+                cache.delete(self.key_template.format(cart_id=self.cart_id))
+            return
+        if not self.cart_id:
+            self.cart_id = secrets.token_urlsafe(16)
+            self._new_id = True
+        cache.set(self.key_template.format(cart_id=self.cart_id), self._pending, settings.CART_COOKIE_AGE)
+        if self._new_id:
+            response.set_cookie(settings.CART_COOKIE_NAME, self.cart_id, max_age=settings.CART_COOKIE_AGE,
+                                httponly=True, samesite='Lax')
+
+
+def get_cart_storage(request) -> BaseCartStorage:
+    return import_string(settings.CART_STORAGE)(request)
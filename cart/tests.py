@@ -1,3 +1,278 @@
-from django.test import TestCase
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import OperationalError, connection, connections
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.models import Category, Product
+from services import product_cache
+from services.inventory import InsufficientStockError, available_to_sell, decrement_stock, reserve_stock, restock
+from .models import StockReservation
+from .storage import CacheCartStorage, CartHeader, CartItem, CartSummary, decode_items, encode_cart, split_cart
+
+
+class CartEncodingTests(SimpleTestCase):
+    items = {7: CartItem(2, 1749), 12: CartItem(3, 450), 15: CartItem(1, 1299)}
+
+    def test_v4_round_trip(self):
+        header = CartHeader(CartSummary.from_items(self.items), price_version=1712345678901, token='Xk2f9q')
+        data = encode_cart(self.items, header)
+        self.assertEqual(data, '4;Xk2f9q;1712345678901;6.3.6147;7.2.1749,12.3.450,15.1.1299')
+        decoded_header, payload = split_cart(data)
+        self.assertEqual(decoded_header, header)
+        self.assertEqual(decode_items(payload), self.items)
+        self.assertEqual(decoded_header.summary.subtotal, Decimal('61.47'))
+
+    def test_empty_cart_encodes_to_nothing(self):
+        self.assertEqual(encode_cart({}, CartHeader(token='abc')), '')
+        self.assertEqual(split_cart(''), (CartHeader(), ''))
+
+    def test_older_formats_still_decode(self):
+        summary = CartSummary(6, 3, 6147)
+        packed = '7.2.1749,12.3.450,15.1.1299'
+        for data, header in (
+            (f'3;99;6.3.6147;{packed}', CartHeader(summary, 99, '')),
+            (f'2;6.3.6147;{packed}', CartHeader(summary, None, '')),
+            (f'1;{packed}', CartHeader(summary=None)),
+        ):
+            decoded_header, payload = split_cart(data)
+            self.assertEqual(decoded_header, header)
+            self.assertEqual(decode_items(payload), self.items)
+
+        legacy = {'7': {'quantity': 2, 'price': '17.49'}, '12': {'quantity': 3, 'price': '4.50'},
+                  '15': {'quantity': 1, 'price': '12.99'}}
+        decoded_header, payload = split_cart(legacy)
+        self.assertIsNone(decoded_header.summary)
+        self.assertEqual(decode_items(payload), self.items)
+
+    def test_corrupt_data_decodes_to_an_empty_cart(self):
+        for data in ('9;whatever', '4;tok;x;1.1.1;1.1.1', '4;tok', 'garbage'):
+            self.assertEqual(split_cart(data), (CartHeader(), ''))
+        self.assertEqual(decode_items('1.2,3.x.4'), {})
+        # Non-positive quantities and negative prices are dropped line by line.
+        self.assertEqual(decode_items('1.0.100,2.-1.100,3.1.-5,4.1.100'), {4: CartItem(1, 100)})
+
+
+class CartQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Bread')
+        cls.products = [
+            Product.objects.create(category=category, name=f'Loaf {i}', price=Decimal('2.50'), stock=10)
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        for product in self.products:
+            self.client.post(reverse('cart:cart_add', args=[product.id]), {'quantity': 2})
+        # Start every page cold so the product lookup has to reach the database.
+        # Only product entries are dropped: losing the price version would
+        # (correctly) make the cart re-price itself and re-stamp the session.
+        product_cache.invalidate_products(product.id for product in self.products)
+
+    def product_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in ctx.captured_queries if '"catalog_product"' in q['sql']]
+
+    def test_cart_detail_hydrates_products_once(self):
+        self.assertLessEqual(len(self.product_queries(reverse('cart:cart_detail'))), 1)
+
+    def test_checkout_page_hydrates_products_once(self):
+        self.assertLessEqual(len(self.product_queries(reverse('orders:order_create'))), 1)
+
+    def test_iteration_does_not_write_to_session(self):
+        stored = self.client.session['cart']
+        self.client.get(reverse('cart:cart_detail'))
+        self.assertEqual(self.client.session['cart'], stored)
+
+
+class CartBatchApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Bread')
+        cls.loaf = Product.objects.create(category=category, name='Loaf', price=Decimal('2.50'), stock=10)
+        cls.retired = Product.objects.create(category=category, name='Old Loaf', price=Decimal('2.00'), stock=10,
+                                             available=False)
+
+    def setUp(self):
+        # Ids are reused after each test's rollback; drop whatever an earlier test cached under them.
+        product_cache.invalidate_products([self.loaf.id, self.retired.id])
+
+    def batch(self, *operations):
+        return self.client.post(reverse('cart:cart_batch'), {'operations': list(operations)},
+                                content_type='application/json')
+
+    def test_valid_batch_updates_the_cart(self):
+        response = self.batch({'op': 'add', 'product_id': self.loaf.id, 'quantity': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cart']['item_count'], 3)
+
+    def test_invalid_operations_are_rejected_without_touching_the_cart(self):
+        for operation in (
+            {'op': 'add', 'product_id': self.retired.id, 'quantity': 1},
+            {'op': 'add', 'product_id': 10 ** 30, 'quantity': 1},
+            {'op': 'add', 'product_id': self.loaf.id, 'quantity': True},
+            {'op': 'add', 'product_id': True, 'quantity': 1},
+            {'op': 'add', 'product_id': self.loaf.id, 'quantity': 1.5},
+        ):
+            with self.subTest(operation=operation):
+                response = self.batch({'op': 'add', 'product_id': self.loaf.id, 'quantity': 1}, operation)
+                self.assertEqual(response.status_code, 400)
+                self.assertTrue(response.json()['errors'])
+                self.assertEqual(response.json()['cart']['item_count'], 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class CartStorageBackendTests:
+    """Shared checks for the buffered backends; mixed into one TestCase per backend below."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Bread')
+        cls.loaf = Product.objects.create(category=category, name='Loaf', price=Decimal('2.50'), stock=10)
+        cls.bun = Product.objects.create(category=category, name='Bun', price=Decimal('0.80'), stock=10)
+
+    def setUp(self):
+        product_cache.invalidate_products([self.loaf.id, self.bun.id])
+
+    def batch(self, *operations):
+        return self.client.post(reverse('cart:cart_batch'), {'operations': list(operations)},
+                                content_type='application/json')
+
+    def cart_item_count(self):
+        return len(self.client.get(reverse('cart:cart_detail')).context['cart'])
+
+    def test_cart_survives_between_requests(self):
+        self.batch({'op': 'add', 'product_id': self.loaf.id, 'quantity': 2})
+        self.assertEqual(self.cart_item_count(), 2)
+        self.client.post(reverse('cart:cart_remove', args=[self.loaf.id]))
+        self.assertEqual(self.cart_item_count(), 0)
+
+    def test_missing_cookie_is_an_empty_cart(self):
+        self.assertEqual(self.cart_item_count(), 0)
+
+    def test_tampered_cookie_is_an_empty_cart(self):
+        self.batch({'op': 'add', 'product_id': self.loaf.id, 'quantity': 2})
+        self.client.cookies[settings.CART_COOKIE_NAME] = self.client.cookies[settings.CART_COOKIE_NAME].value + 'x'
+        self.assertEqual(self.cart_item_count(), 0)
+
+
+@override_settings(CART_STORAGE='cart.storage.SignedCookieCartStorage')
+class SignedCookieCartStorageTests(CartStorageBackendTests, TestCase):
+    def test_several_mutations_write_one_cookie(self):
+        with mock.patch.object(HttpResponse, 'set_signed_cookie', autospec=True,
+                               side_effect=HttpResponse.set_signed_cookie) as set_signed_cookie:
+            response = self.batch({'op': 'add', 'product_id': self.loaf.id, 'quantity': 2},
+                                  {'op': 'add', 'product_id': self.bun.id, 'quantity': 3})
+        self.assertEqual(response.json()['cart']['item_count'], 5)
+        self.assertEqual(set_signed_cookie.call_count, 1)
+
+    def test_reads_do_not_rewrite_the_cookie(self):
+        self.batch({'op': 'add', 'product_id': self.loaf.id, 'quantity': 2})
+        response = self.client.get(reverse('cart:cart_detail'))
+        self.assertNotIn(settings.CART_COOKIE_NAME, response.cookies)
+
+
+@override_settings(CART_STORAGE='cart.storage.CacheCartStorage')
+class CacheCartStorageTests(CartStorageBackendTests, TestCase):
+    def cache_key(self):
+        return CacheCartStorage.key_template.format(cart_id=self.client.cookies[settings.CART_COOKIE_NAME].value)
+
+    def test_cart_lives_in_the_cache_under_the_cookie_id(self):
+        self.batch({'op': 'add', 'product_id': self.loaf.id, 'quantity': 2},
+                   {'op': 'add', 'product_id': self.bun.id, 'quantity': 3})
+        self.assertIsNotNone(cache.get(self.cache_key()))
+        response = self.batch({'op': 'add', 'product_id': self.loaf.id, 'quantity': 1})
+        self.assertNotIn(settings.CART_COOKIE_NAME, response.cookies)
+
+    def test_emptying_the_cart_drops_the_cache_entry(self):
+        self.batch({'op': 'add', 'product_id': self.loaf.id, 'quantity': 2})
+        key = self.cache_key()
+        self.client.post(reverse('cart:cart_remove', args=[self.loaf.id]))
+        self.assertIsNone(cache.get(key))
+
+
+class DecrementStockTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Bread')
+        self.loaf = Product.objects.create(category=category, name='Loaf', price=Decimal('2.50'), stock=5)
+        self.roll = Product.objects.create(category=category, name='Roll', price=Decimal('0.50'), stock=2)
+        reserve_stock('other-cart', self.loaf, 1)
+
+    def test_shortfall_names_each_short_line_and_decrements_nothing(self):
+        with self.assertRaises(InsufficientStockError) as ctx:
+            decrement_stock({self.loaf.id: 4, self.roll.id: 3})
+        self.assertEqual(str(ctx.exception), "Only 2 of Roll left in stock, 3 requested.")
+
+        with self.assertRaises(InsufficientStockError) as ctx:
+            decrement_stock({self.loaf.id: 5, self.roll.id: 3})
+        # The loaf held by the other cart is not counted as available.
+        self.assertIn("Only 4 of Loaf left in stock, 5 requested.", str(ctx.exception))
+        self.assertIn("Only 2 of Roll left in stock, 3 requested.", str(ctx.exception))
+
+        self.assertEqual(dict(Product.objects.values_list('name', 'stock')), {'Loaf': 5, 'Roll': 2})
+
+    def test_own_reservation_is_not_held_against_the_order(self):
+        decrement_stock({self.loaf.id: 5}, exclude_token='other-cart')
+        self.loaf.refresh_from_db()
+        self.assertEqual((self.loaf.stock, self.loaf.available), (0, False))
+
+    def test_restock_only_brings_back_sold_out_products(self):
+        decrement_stock({self.loaf.id: 5}, exclude_token='other-cart')
+        Product.objects.filter(pk=self.roll.pk).update(available=False)  # Taken off sale by staff.
+        restock({self.loaf.id: 2, self.roll.id: 1})
+        self.assertEqual(sorted(Product.objects.values_list('name', 'stock', 'available')),
+                         [('Loaf', 2, True), ('Roll', 3, False)])
+
+
+class StockReservationConcurrencyTests(TransactionTestCase):
+    BUYERS = 20
+    STOCK = 5
+
+    def setUp(self):
+        category = Category.objects.create(name='Cakes')
+        self.product = Product.objects.create(category=category, name='Last Cake', price=Decimal('9.00'),
+                                              stock=self.STOCK)
+
+    def buy(self, token, outcomes):
+        # SQLite serializes writers by failing the loser with "locked"; keep retrying like a client would.
+        try:
+            for _ in range(200):
+                try:
+                    reserve_stock(token, self.product, 1)
+                    outcomes.append('reserved')
+                    return
+                except InsufficientStockError:
+                    outcomes.append('sold out')
+                    return
+                except OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                    time.sleep(0.01)
+            outcomes.append('locked')
+        finally:
+            connections.close_all()
+
+    def test_parallel_buyers_do_not_oversell(self):
+        outcomes = []
+        threads = [threading.Thread(target=self.buy, args=(f'buyer-{i}', outcomes)) for i in range(self.BUYERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Every unit is sold and everyone else is told it is gone, not turned away by a lock.
+        self.assertEqual(sorted(outcomes), ['reserved'] * self.STOCK + ['sold out'] * (self.BUYERS - self.STOCK))
+        reserved = StockReservation.objects.filter(product=self.product).aggregate(total=Sum('quantity'))['total']
+        self.assertEqual(reserved, self.STOCK)
+        self.assertEqual(available_to_sell([self.product.id]), {self.product.id: 0})
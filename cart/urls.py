@@ -7,4 +7,5 @@ urlpatterns = [
     path('', views.cart_detail, name='cart_detail'),
     path('add/<int:product_id>/', views.cart_add, name='cart_add'),
     path('remove/<int:product_id>/', views.cart_remove, name='cart_remove'),
+    path('api/batch/', views.cart_batch, name='cart_batch'),
 ]
\ No newline at end of file
@@ -1,8 +1,10 @@
-from django.shortcuts import render, redirect, get_object_or_404
+import json
+from django.contrib import messages
+from django.http import JsonResponse
+from django.shortcuts import render, redirect
 from django.views.decorators.http import require_POST
-from catalog.models import Product
-from services.commands import AddToCartCommand
-from .cart import Cart
+from services.commands import AddToCartCommand, BatchCartCommand, RemoveFromCartCommand
+from .cart import get_cart
 from .forms import CartAddProductForm
 
 @require_POST
@@ -20,8 +22,8 @@ def cart_add(request, product_id):
 
         try:
             success = command.execute()
-            if not success:
-                pass
+            if not success and command.error:
+                messages.error(request, command.error)
         except Exception as e:
             print(f"Error executing AddToCartCommand: {str(e)}")
             pass
@@ -30,20 +32,48 @@ def cart_add(request, product_id):
 
 @require_POST
 def cart_remove(request, product_id):
-    cart = Cart(request)
-    product = get_object_or_404(Product, id=product_id)
-    cart.remove(product)
+    RemoveFromCartCommand(request=request, product_id=product_id).execute()
     return redirect('cart:cart_detail')
 
 
 def cart_detail(request):
-    cart = Cart(request)
-    for item in cart:
-        item['update_quantity_form'] = CartAddProductForm(
-            initial={'quantity': item['quantity'], 'update_quantity': True}
-        )
+    cart = get_cart(request)
+    price_changes = cart.refresh_prices()
+    cart_rows = [
+        (line, CartAddProductForm(initial={'quantity': line.quantity, 'update_quantity': True}))
+        for line in cart
+    ]
 
     context = {
         'cart': cart,
+        'cart_rows': cart_rows,
+        'price_changes': price_changes,
+    }
+    return render(request, 'cart/detail.html', context)
+
+
+def summary_json(cart):
+    summary = cart.summary
+    return {
+        'item_count': summary.item_count,
+        'line_count': summary.line_count,
+        'subtotal': str(summary.subtotal),
     }
-    return render(request, 'cart/detail.html', context)
\ No newline at end of file
+
+
+@require_POST
+def cart_batch(request):
+    """
+    JSON body ``{"operations": [...]}``, see BatchCartCommand. Responds with the
+    new cart summary, or 400 with the errors and the cart left unchanged.
+    """
+    try:
+        payload = json.loads(request.body)
+    except (UnicodeDecodeError, ValueError):
+        return JsonResponse({'errors': ['Request body must be JSON.']}, status=400)
+    operations = payload.get('operations') if isinstance(payload, dict) else None
+
+    command = BatchCartCommand(request=request, operations=operations)
+    if not command.execute():
+        return JsonResponse({'errors': command.errors, 'cart': summary_json(get_cart(request))}, status=400)
+    return JsonResponse({'cart': summary_json(get_cart(request))})
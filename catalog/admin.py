@@ -1,6 +1,21 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.db.models import Case, IntegerField, Value, When
+
+from services.product_search import is_search_available, search_product_ids
 from .models import Category, Product
 
+ADMIN_SEARCH_LIMIT = 1000
+
+
+class RankedChangeList(ChangeList):
+    """Lists full-text search hits best match first unless a column header was clicked."""
+
+    def get_ordering(self, request, queryset):
+        if 'search_rank' in queryset.query.annotations and ORDER_VAR not in self.params:
+            return ['search_rank', '-pk']
+        return super().get_ordering(request, queryset)
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -20,6 +35,19 @@ class ProductAdmin(admin.ModelAdmin):
     list_editable = ['price', 'stock', 'available']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name', 'category__name']
+    search_help_text = (f"Matches name, description and category words by prefix, best match first. "
+                        f"Only the {ADMIN_SEARCH_LIMIT} best matches are listed.")
+
+    def get_changelist(self, request, **kwargs):
+        return RankedChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip() or not is_search_available():
+            return super().get_search_results(request, queryset, search_term)
+        ids = search_product_ids(search_term, limit=ADMIN_SEARCH_LIMIT, available_only=False)
+        rank = Case(*[When(id=pk, then=Value(position)) for position, pk in enumerate(ids)],
+                    output_field=IntegerField())
+        return queryset.filter(id__in=ids).annotate(search_rank=rank), False
 
     def category_name(self, obj):
         return obj.category.name
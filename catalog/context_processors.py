@@ -0,0 +1,7 @@
+from django.utils.functional import SimpleLazyObject
+
+from services.category_tree import get_category_tree, flatten_category_tree
+
+
+def category_tree(request):
+    return {'category_nav': SimpleLazyObject(lambda: flatten_category_tree(get_category_tree()))}
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import Product
+from services.image_derivatives import generate_for_products
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/JPEG derivatives for existing product images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Regenerate images that already have derivatives.")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Process pool size, defaults to IMAGE_DERIVATIVE_WORKERS.")
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').only('id', 'image', 'image_variants')
+        if not options['force']:
+            products = products.filter(image_variants=[])
+
+        done = failed = 0
+        for product, result in generate_for_products(products.iterator(), workers=options['workers']):
+            if isinstance(result, Exception):
+                failed += 1
+                self.stderr.write(f"Product {product.pk} ({product.image.name}): {result}")
+            else:
+                done += 1
+        self.stdout.write(self.style.SUCCESS(f"Derivatives generated for {done} images, {failed} failed."))
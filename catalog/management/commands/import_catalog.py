@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from services.catalog_import import CatalogImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = "Stream products from a CSV or JSON Lines file, upserting them in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file with name, price, category and optional sku, "
+                                         "slug, description, stock, available columns.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension.")
+        parser.add_argument('--key', choices=['sku', 'slug'], default='sku',
+                            help="Column used to match existing products for updates.")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--create-categories', action='store_true',
+                            help="Create categories that do not exist yet instead of skipping the row.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+        importer = CatalogImporter(
+            key=options['key'],
+            batch_size=options['batch_size'],
+            create_categories=options['create_categories'],
+        )
+        try:
+            report = importer.run(read_rows(options['path'], options['format']))
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in report.errors[:20]:
+            self.stderr.write(error)
+        if len(report.errors) > 20:
+            self.stderr.write(f"... and {len(report.errors) - 20} more row errors.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report.rows} rows in {report.batches} batches: "
+            f"{report.created} created, {report.updated} updated, {report.skipped} skipped."
+        ))
+        self.stdout.write(f"Elapsed {report.elapsed:.2f}s, {report.rows_per_second:.0f} rows/s.")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import Category
+from services.category_tree import bump_category_tree_version
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized category paths from the parent links."
+
+    def handle(self, *args, **options):
+        changed = Category.rebuild_tree()
+        bump_category_tree_version()
+        self.stdout.write(self.style.SUCCESS(f"Category tree rebuilt: {changed} categories updated."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from services.cache_versions import bump_version, CATALOG_VERSION
+from services.catalog_facets import rebuild_facet_counts
+
+
+class Command(BaseCommand):
+    help = "Recount the precomputed catalog facet cells from the product table."
+
+    def handle(self, *args, **options):
+        cells = rebuild_facet_counts()
+        bump_version(CATALOG_VERSION)
+        self.stdout.write(self.style.SUCCESS(f"Facet counts rebuilt: {cells} cells."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from services.product_search import rebuild_index, is_search_available
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text product search index from the product table."
+
+    def handle(self, *args, **options):
+        if not is_search_available():
+            self.stderr.write("Full-text search needs the SQLite FTS5 backend; nothing to do.")
+            return
+        indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt: {indexed} products indexed."))
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:43
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def populate_category_paths(apps, schema_editor):
+    Category = apps.get_model('catalog', 'Category')
+    nodes = list(Category.objects.only('id', 'parent_id').order_by('id'))
+    children = defaultdict(list)
+    for node in nodes:
+        children[node.parent_id].append(node)
+
+    stack = [(node, '', 0) for node in children[None]]
+    while stack:
+        node, parent_path, depth = stack.pop()
+        node.path = f'{parent_path}{node.pk}/'
+        node.depth = depth
+        stack.extend((child, node.path, depth + 1) for child in children[node.pk])
+
+    Category.objects.bulk_update(nodes, ['path', 'depth'], batch_size=500)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(populate_category_paths, migrations.RunPython.noop),
+    ]
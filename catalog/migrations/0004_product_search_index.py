@@ -0,0 +1,45 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Category = apps.get_model('catalog', 'Category')
+    Product = apps.get_model('catalog', 'Product')
+
+    names = dict(Category.objects.values_list('id', 'name'))
+    paths = {
+        pk: ' '.join(names.get(int(a), '') for a in path.split('/') if a)
+        for pk, path in Category.objects.values_list('id', 'path')
+    }
+    rows = [
+        (pk, name, description, paths.get(category_id, ''))
+        for pk, name, description, category_id
+        in Product.objects.values_list('id', 'name', 'description', 'category_id')
+    ]
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE catalog_product_fts USING fts5("
+        "name, description, category_path, tokenize='unicode61 remove_diacritics 2')"
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO catalog_product_fts (rowid, name, description, category_path) VALUES (%s, %s, %s, %s)',
+            rows
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS catalog_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_product_listing_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:48
+
+from bisect import bisect_right
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_facet_counts(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    ProductFacetCount = apps.get_model('catalog', 'ProductFacetCount')
+    bounds = settings.CATALOG_PRICE_BUCKETS
+    cells = Counter(
+        (category_id, max(bisect_right(bounds, price) - 1, 0), stock > 0)
+        for category_id, price, stock
+        in Product.objects.filter(available=True).values_list('category_id', 'price', 'stock').iterator()
+    )
+    ProductFacetCount.objects.bulk_create(
+        [ProductFacetCount(category_id=c, price_bucket=b, in_stock=s, count=n) for (c, b, s), n in cells.items()],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_bucket', models.PositiveSmallIntegerField()),
+                ('in_stock', models.BooleanField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['available', 'category', 'price'], name='catalog_product_facet_idx'),
+        ),
+        migrations.AddField(
+            model_name='productfacetcount',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facet_counts', to='catalog.category'),
+        ),
+        migrations.AddConstraint(
+            model_name='productfacetcount',
+            constraint=models.UniqueConstraint(fields=('category', 'price_bucket', 'in_stock'), name='catalog_facet_cell_unique'),
+        ),
+        migrations.RunPython(populate_facet_counts, migrations.RunPython.noop),
+    ]
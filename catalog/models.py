@@ -1,7 +1,44 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.utils.text import slugify
 from django.urls import reverse
 
+
+CATEGORY_PATH_SEPARATOR = '/'
+
+
+def _subtree_upper_bound(path):
+    # Every descendant path starts with ``path``; swapping the trailing separator
+    # for the next character gives an exclusive upper bound for a range scan.
+    return path[:-1] + chr(ord(CATEGORY_PATH_SEPARATOR) + 1)
+
+
+def allocate_unique_slug(base_slug, taken, start=1):
+    """
+    First of ``base_slug``, ``base_slug-1``, ``base_slug-2``... not in ``taken``.
+    """
+    slug = base_slug
+    counter = start
+    while slug in taken:
+        slug = f"{base_slug}-{counter}"
+        counter += 1
+    return slug
+
+
+class CategoryQuerySet(models.QuerySet):
+    def subtree(self, category, include_self=True):
+        """
+        The category and all of its descendants as one indexed range scan on ``path``.
+        """
+        qs = self.filter(path__gte=category.path, path__lt=_subtree_upper_bound(category.path))
+        if not include_self:
+            qs = qs.exclude(pk=category.pk)
+        return qs
+
+
 class Category(models.Model):
     name = models.CharField(max_length=200, db_index=True)
     slug = models.SlugField(max_length=200, unique=True, blank=True)
@@ -13,6 +50,11 @@ class Category(models.Model):
         related_name='children'
     )
     description = models.TextField(blank=True)
+    # Materialized path of ancestor ids including this node, e.g. "1/4/9/".
+    path = models.CharField(max_length=255, db_index=True, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    objects = CategoryQuerySet.as_manager()
 
     class Meta:
         ordering = ('name',)
@@ -20,17 +62,85 @@ class Category(models.Model):
         verbose_name_plural = 'categories'
 
     def __str__(self):
-        full_path = [self.name]
-        k = self.parent
-        while k is not None:
-            full_path.append(k.name)
-            k = k.parent
-        return ' -> '.join(full_path[::-1])
+        if self.depth == 0:
+            return self.name
+        return ' -> '.join(c.name for c in self.get_ancestors(include_self=True))
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._sync_path()
+
+    def _sync_path(self):
+        """
+        Recompute this node's path after a save and re-root its subtree if it moved.
+        """
+        old_path, old_depth = Category.objects.filter(pk=self.pk).values_list('path', 'depth').get()
+
+        parent_path, depth = '', 0
+        if self.parent_id:
+            parent_path, parent_depth = Category.objects.filter(
+                pk=self.parent_id).values_list('path', 'depth').get()
+            if old_path and parent_path.startswith(old_path):
+                raise ValueError("A category cannot be moved under itself or one of its descendants.")
+            depth = parent_depth + 1
+
+        new_path = f'{parent_path}{self.pk}{CATEGORY_PATH_SEPARATOR}'
+        if new_path != old_path or depth != old_depth:
+            if old_path:
+                Category.objects.filter(
+                    path__gt=old_path, path__lt=_subtree_upper_bound(old_path)
+                ).update(
+                    path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + (depth - old_depth),
+                )
+            Category.objects.filter(pk=self.pk).update(path=new_path, depth=depth)
+        self.path, self.depth = new_path, depth
+
+    def get_ancestor_ids(self, include_self=False):
+        ids = [int(pk) for pk in self.path.split(CATEGORY_PATH_SEPARATOR) if pk]
+        return ids if include_self else ids[:-1]
+
+    def get_ancestors(self, include_self=False):
+        """
+        Root-first breadcrumb, fetched with a single primary key lookup.
+        """
+        ids = self.get_ancestor_ids(include_self=include_self)
+        if not ids:
+            return Category.objects.none()
+        return Category.objects.filter(pk__in=ids).order_by('depth')
+
+    def get_descendants(self, include_self=False):
+        return Category.objects.subtree(self, include_self=include_self)
+
+    def get_descendant_count(self):
+        return self.get_descendants().count()
+
+    @classmethod
+    def rebuild_tree(cls):
+        """
+        Recompute ``path`` and ``depth`` for every category from the ``parent`` links.
+        Returns the number of rows that were corrected.
+        """
+        nodes = list(cls.objects.only('id', 'parent_id', 'path', 'depth').order_by('id'))
+        children = defaultdict(list)
+        for node in nodes:
+            children[node.parent_id].append(node)
+
+        changed = []
+        stack = [(node, '', 0) for node in children[None]]
+        while stack:
+            node, parent_path, depth = stack.pop()
+            path = f'{parent_path}{node.pk}{CATEGORY_PATH_SEPARATOR}'
+            if node.path != path or node.depth != depth:
+                node.path, node.depth = path, depth
+                changed.append(node)
+            stack.extend((child, path, depth + 1) for child in children[node.pk])
+
+        cls.objects.bulk_update(changed, ['path', 'depth'], batch_size=500)
+        return len(changed)
 
     def get_absolute_url(self):
         return reverse('catalog:product_list_by_category', args=[self.slug])
@@ -44,8 +154,11 @@ class Product(models.Model):
     )
     name = models.CharField(max_length=200, db_index=True)
     slug = models.SlugField(max_length=200, db_index=True, blank=True)
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='products/%Y/%m/%d', blank=True)
+    # Widths of the resized copies generated next to ``image``, see services.image_derivatives.
+    image_variants = models.JSONField(default=list, blank=True, editable=False)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
     available = models.BooleanField(default=True)
@@ -53,22 +166,73 @@ class Product(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ('name',)
+        ordering = ('name', 'id')
         index_together = (('id', 'slug'),)
+        indexes = [
+            # Covers the keyset seek of the storefront listing: available=True ORDER BY name, id.
+            models.Index(fields=['available', 'name', 'id'], name='catalog_product_listing_idx'),
+            # Category + price range filters of the faceted listing.
+            models.Index(fields=['available', 'category', 'price'], name='catalog_product_facet_idx'),
+        ]
+
+    # Fields whose loaded value is remembered so post_save receivers can tell what changed.
+    TRACKED_FIELDS = ('category_id', 'image', 'price', 'stock', 'available')
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if name in cls.TRACKED_FIELDS
+        }
+        return instance
+
+    def _tracked_value(self, name):
+        value = getattr(self, name)
+        return value.name if name == 'image' else value
+
+    def get_loaded_value(self, name, default=None):
+        """Value of a tracked field as of the last load from or save to the database."""
+        return getattr(self, '_loaded_values', {}).get(name, default)
+
+    def has_changed(self, name):
+        loaded = getattr(self, '_loaded_values', {})
+        return name not in loaded or loaded[name] != self._tracked_value(name)
+
     def save(self, *args, **kwargs):
         if not self.slug:
             base_slug = slugify(self.name)
-            slug = base_slug
-            counter = 1
-            while Product.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
+            taken = set(Product.objects.filter(
+                models.Q(slug=base_slug) | models.Q(slug__startswith=f'{base_slug}-')
+            ).values_list('slug', flat=True))
+            self.slug = allocate_unique_slug(base_slug, taken)
+        if self.has_changed('image'):
+            self.image_variants = []
         super().save(*args, **kwargs)
+        self._loaded_values = {name: self._tracked_value(name) for name in self.TRACKED_FIELDS}
 
     def get_absolute_url(self):
-        return reverse('catalog:product_detail', args=[self.id, self.slug])
\ No newline at end of file
+        return reverse('catalog:product_detail', args=[self.id, self.slug])
+
+
+class ProductFacetCount(models.Model):
+    """
+    Precomputed facet cube: how many available products fall into each
+    (category, price bucket, in stock) cell. Maintained incrementally from
+    Product changes by services.catalog_facets.
+    """
+    category = models.ForeignKey(Category, related_name='facet_counts', on_delete=models.CASCADE)
+    price_bucket = models.PositiveSmallIntegerField()
+    in_stock = models.BooleanField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'price_bucket', 'in_stock'],
+                                    name='catalog_facet_cell_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.category_id}/{self.price_bucket}/{self.in_stock}: {self.count}'
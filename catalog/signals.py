@@ -0,0 +1,120 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver, Signal
+
+from services.cache_versions import bump_version, CATALOG_VERSION, PRICE_VERSION
+from services.category_tree import bump_category_tree_version
+from services import catalog_facets, product_search
+from services.image_derivatives import schedule_derivatives
+from services.product_cache import invalidate_products
+from .models import Category, Product
+
+# Sent after Product rows were written without going through Product.save(),
+# e.g. bulk_create/bulk_update or F() updates. Arguments: product_ids, fields
+# (the changed field names, or None when unknown) and optionally category_ids,
+# categories the products were moved out of.
+products_changed = Signal()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_tree_changed(sender, **kwargs):
+    bump_category_tree_version()
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, **kwargs):
+    # A rename or move changes the category path indexed for every product below it.
+    if not created:
+        product_search.index_products(
+            Product.objects.filter(
+                category__in=Category.objects.subtree(instance).values('id')
+            ).values_list('id', flat=True)
+        )
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    product_search.index_products([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def queue_image_derivatives(sender, instance, **kwargs):
+    if instance.image and instance.has_changed('image'):
+        transaction.on_commit(lambda: schedule_derivatives(instance))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    product_search.remove_products([instance.pk])
+
+
+@receiver(products_changed)
+def reindex_changed_products(sender, product_ids, fields=None, **kwargs):
+    if fields is None or {'name', 'description', 'category'} & set(fields):
+        product_search.index_products(product_ids)
+
+
+@receiver(post_save, sender=Product)
+def update_facet_counts(sender, instance, **kwargs):
+    catalog_facets.apply_product_change(
+        catalog_facets.loaded_facet_key(instance), catalog_facets.current_facet_key(instance)
+    )
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_facet_counts(sender, instance, **kwargs):
+    old_key = catalog_facets.loaded_facet_key(instance) or catalog_facets.current_facet_key(instance)
+    catalog_facets.apply_product_change(old_key, None)
+
+
+@receiver(products_changed)
+def recount_changed_facets(sender, product_ids, fields=None, category_ids=(), **kwargs):
+    if fields is None:
+        catalog_facets.rebuild_facet_counts()
+    elif {'category', 'price', 'stock', 'available'} & set(fields):
+        catalog_facets.rebuild_facet_counts(set(category_ids) | set(
+            Product.objects.filter(id__in=product_ids).order_by().values_list('category_id', flat=True).distinct()
+        ))
+
+
+# Cache eviction and version bumps wait for the commit: done earlier, a
+# concurrent request could re-cache the old row before it is replaced.
+def _after_commit(func, *args):
+    transaction.on_commit(lambda: func(*args))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def evict_cached_product(sender, instance, **kwargs):
+    _after_commit(invalidate_products, [instance.pk])
+
+
+@receiver(products_changed)
+def evict_cached_products(sender, product_ids, **kwargs):
+    _after_commit(invalidate_products, list(product_ids))
+
+
+@receiver(post_save, sender=Product)
+def price_changed(sender, instance, created, **kwargs):
+    if not created and instance.has_changed('price'):
+        _after_commit(bump_version, PRICE_VERSION)
+
+
+@receiver(products_changed)
+def prices_bulk_changed(sender, fields=None, **kwargs):
+    if fields is None or 'price' in fields:
+        _after_commit(bump_version, PRICE_VERSION)
+
+
+# Registered last so that everything cached under the new catalog version is
+# computed from already-updated derived data (facet counts, search index).
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def catalog_changed(sender, **kwargs):
+    _after_commit(bump_version, CATALOG_VERSION)
+
+
+@receiver(products_changed)
+def catalog_bulk_changed(sender, **kwargs):
+    _after_commit(bump_version, CATALOG_VERSION)
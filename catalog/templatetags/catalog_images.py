@@ -0,0 +1,21 @@
+from django import template
+
+from services.image_derivatives import get_srcset
+
+register = template.Library()
+
+
+@register.inclusion_tag('catalog/product/_picture.html')
+def product_picture(product, css_class='', sizes='100vw'):
+    """
+    <picture> for a product image: WebP and JPEG srcsets when derivatives exist,
+    the original upload otherwise.
+    """
+    has_variants = bool(product.image and product.image_variants)
+    return {
+        'product': product,
+        'css_class': css_class,
+        'sizes': sizes,
+        'webp_srcset': get_srcset(product, 'webp') if has_variants else '',
+        'jpeg_srcset': get_srcset(product, 'jpeg') if has_variants else '',
+    }
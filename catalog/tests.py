@@ -1,3 +1,437 @@
-from django.test import TestCase
+import os
+import random
+import re
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from services import catalog_facets, image_derivatives, product_cache, product_card_cache, product_search
+from services.cache_versions import CATALOG_VERSION, PRICE_VERSION, bump_version, get_version
+from services.catalog_import import CatalogImporter
+from services.category_tree import CATEGORY_TREE_VERSION
+from services.inventory import decrement_stock
+from services.pagination import KeysetPaginator
+from .context_processors import category_tree
+from .models import Category, Product, ProductFacetCount
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        self.bread = Category.objects.create(name='Bread')
+        self.rye = Category.objects.create(name='Rye', parent=self.bread)
+        self.dark_rye = Category.objects.create(name='Dark Rye', parent=self.rye)
+        self.cakes = Category.objects.create(name='Cakes')
+
+    def test_path_and_depth_follow_the_parents(self):
+        self.assertEqual(self.dark_rye.path, f'{self.bread.id}/{self.rye.id}/{self.dark_rye.id}/')
+        self.assertEqual([self.bread.depth, self.rye.depth, self.dark_rye.depth], [0, 1, 2])
+        self.assertEqual(list(self.dark_rye.get_ancestors()), [self.bread, self.rye])
+        self.assertEqual(set(Category.objects.subtree(self.bread)), {self.bread, self.rye, self.dark_rye})
+        self.assertEqual(set(self.bread.get_descendants()), {self.rye, self.dark_rye})
+
+    def test_moving_a_category_re_roots_its_subtree(self):
+        self.rye.parent = self.cakes
+        self.rye.save()
+        self.dark_rye.refresh_from_db()
+        self.assertEqual(self.dark_rye.path, f'{self.cakes.id}/{self.rye.id}/{self.dark_rye.id}/')
+        self.assertEqual(self.dark_rye.depth, 2)
+        self.assertEqual(set(Category.objects.subtree(self.bread)), {self.bread})
+
+        self.rye.parent = None
+        self.rye.save()
+        self.dark_rye.refresh_from_db()
+        self.assertEqual((self.dark_rye.path, self.dark_rye.depth), (f'{self.rye.id}/{self.dark_rye.id}/', 1))
+
+    def test_cycles_are_rejected(self):
+        for parent in (self.rye, self.dark_rye):
+            self.bread.parent = parent
+            with self.assertRaises(ValueError):
+                self.bread.save()
+        self.bread.refresh_from_db()
+        self.assertIsNone(self.bread.parent_id)
+        self.assertEqual(self.bread.path, f'{self.bread.id}/')
+
+    def test_rebuild_repairs_corrupted_paths(self):
+        Category.objects.filter(pk=self.rye.pk).update(path='junk/', depth=7)
+        Category.objects.filter(pk=self.dark_rye.pk).update(path='', depth=0)
+        call_command('rebuild_category_tree', stdout=StringIO())
+        self.dark_rye.refresh_from_db()
+        self.assertEqual((self.dark_rye.path, self.dark_rye.depth),
+                         (f'{self.bread.id}/{self.rye.id}/{self.dark_rye.id}/', 2))
+        self.assertEqual(Category.rebuild_tree(), 0)
+
+
+class CategoryNavigationTests(TestCase):
+    def setUp(self):
+        self.bread = Category.objects.create(name='Bread')
+        self.rye = Category.objects.create(name='Rye', parent=self.bread)
+
+    def sidebar(self):
+        return [(node['name'], node['depth']) for node in category_tree(RequestFactory().get('/'))['category_nav']]
+
+    def test_warm_sidebar_costs_no_queries(self):
+        self.sidebar()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.sidebar(), [('Bread', 0), ('Rye', 1)])
+
+    def test_category_save_rebuilds_the_sidebar(self):
+        self.assertEqual(self.sidebar(), [('Bread', 0), ('Rye', 1)])
+        self.rye.name = 'Dark Rye'
+        self.rye.save()
+        Category.objects.create(name='Cakes')
+        self.assertEqual(self.sidebar(), [('Bread', 0), ('Dark Rye', 1), ('Cakes', 0)])
+        self.assertContains(self.client.get(reverse('catalog:product_list')), 'Dark Rye')
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Bread')
+        # Repeated names, so only the id keeps the ordering unique.
+        for i in range(11):
+            Product.objects.create(category=category, name=f'Loaf {i % 4}', price=Decimal('2.00'))
+        cls.expected = list(Product.objects.order_by('name', 'id').values_list('id', flat=True))
+
+    def paginator(self, **kwargs):
+        return KeysetPaginator(Product.objects.all(), ordering=('name', 'id'), per_page=3, **kwargs)
+
+    def test_next_then_previous_walks_back_the_same_pages(self):
+        pages, page = [], self.paginator().get_page()
+        while True:
+            pages.append(page)
+            if not page.has_next:
+                break
+            page = self.paginator().get_page(page.next_cursor)
+        self.assertEqual([p.id for page in pages for p in page], self.expected)
+        self.assertFalse(pages[0].has_previous)
+
+        back = pages[-1]
+        for expected_page in reversed(pages[:-1]):
+            back = self.paginator().get_page(back.previous_cursor)
+            self.assertEqual([p.id for p in back], [p.id for p in expected_page])
+        self.assertFalse(back.has_previous)
+
+    def test_tampered_or_foreign_cursor_falls_back_to_the_first_page(self):
+        first = self.paginator().get_page()
+        cursor = self.paginator().get_page(first.next_cursor).next_cursor
+        for bad in (cursor[:-2] + 'xx', 'garbage', self.paginator(salt='other').get_page().next_cursor):
+            self.assertEqual([p.id for p in self.paginator().get_page(bad)], self.expected[:3])
+
+    def test_product_list_ignores_a_tampered_cursor(self):
+        response = self.client.get(reverse('catalog:product_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Pastry')
+        # Alphabetically first, but "rye" only appears in its description.
+        cls.tart = Product.objects.create(category=category, name='Apple Tart', description='Rye crust.',
+                                          price=Decimal('4.00'))
+        cls.loaf = Product.objects.create(category=category, name='Zesty Rye', price=Decimal('3.00'))
+
+    def test_out_of_range_page_falls_back_to_the_first(self):
+        for page in ('99999999999999999999', '-3', '0', 'x'):
+            response = self.client.get(reverse('catalog:product_search'), {'q': 'rye', 'page': page})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['page'].number, 1)
+
+    def test_last_served_page_has_no_next(self):
+        with mock.patch.object(product_search, 'MAX_PAGE', 2):
+            first = product_search.search_products('rye', page=1, per_page=1)
+            last = product_search.search_products('rye', page=2, per_page=1)
+            self.assertTrue(first.has_next)
+            self.assertEqual(last.number, 2)
+            self.assertFalse(last.has_next)
+
+            # The same holds when there are more results than the served pages hold.
+            Product.objects.create(category=self.loaf.category, name='Rye Roll', price=Decimal('1.00'))
+            self.assertFalse(product_search.search_products('rye', page=2, per_page=1).has_next)
+
+    def test_admin_search_keeps_the_ranking(self):
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:catalog_product_changelist'), {'q': 'rye'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.loaf, self.tart])
+        self.assertContains(response, 'best matches are listed')
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(category=Category.objects.create(name='Bread'), name='Loaf',
+                                              price=Decimal('2.00'), stock=5)
+        self.url = reverse('catalog:product_list')
+        # The first response sets the CSRF cookie, which is part of the validator from then on.
+        self.client.get(self.url)
+        self.etag = self.client.get(self.url)['ETag']
+
+    def test_unchanged_page_is_a_304_without_catalog_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in ctx.captured_queries if 'catalog_' in q['sql']])
+
+    def test_product_change_invalidates_the_etag(self):
+        self.product.price = Decimal('2.50')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], self.etag)
+
+    def test_cart_badge_is_part_of_the_etag(self):
+        self.client.post(reverse('cart:cart_add', args=[self.product.id]), {'quantity': 1})
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag).status_code, 200)
+
+    def test_if_modified_since_alone_never_serves_a_stale_cart_badge(self):
+        bump_version(CATALOG_VERSION)
+        bump_version(CATEGORY_TREE_VERSION)
+        response = self.client.get(self.url)
+        self.assertNotIn('Last-Modified', response)
+        self.client.post(reverse('cart:cart_add', args=[self.product.id]), {'quantity': 1})
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cart'].summary.item_count, 1)
+
+
+class ProductCacheTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Bread')
+        self.loaf = Product.objects.create(category=category, name='Loaf', price=Decimal('2.00'), stock=5)
+        self.roll = Product.objects.create(category=category, name='Roll', price=Decimal('0.50'), stock=5)
+        # Ids are reused after each test's rollback; drop whatever an earlier test cached under them.
+        product_cache.invalidate_products([self.loaf.pk, self.roll.pk])
+        product_cache.get_products([self.loaf.pk, self.roll.pk])
+
+    def cached(self, product):
+        return cache.get(product_cache.PRODUCT_KEY.format(product_id=product.pk)) is not None
+
+    def test_cache_is_invalidated_only_once_the_write_commits(self):
+        self.loaf.price = Decimal('2.40')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.loaf.save()
+            # Until the commit the old row stays, so nothing can re-cache it after the eviction.
+            self.assertTrue(self.cached(self.loaf))
+        self.assertTrue(callbacks)
+        self.assertFalse(self.cached(self.loaf))
+        self.assertEqual(product_cache.get_product(self.loaf.pk).price, Decimal('2.40'))
+
+    def test_an_order_evicts_only_the_products_it_took_stock_from(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            decrement_stock({self.loaf.pk: 1})
+        self.assertFalse(self.cached(self.loaf))
+        self.assertTrue(self.cached(self.roll))
+        with self.assertNumQueries(0):
+            self.assertEqual(product_cache.get_product(self.roll.pk).stock, 5)
+        self.assertEqual(product_cache.get_product(self.loaf.pk).stock, 4)
+
+
+class ProductCardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Bread')
+        cls.products = [Product.objects.create(category=category, name=f'Loaf {i}', price=Decimal('2.00'), stock=5)
+                        for i in range(3)]
+        # Looks like the placeholder, but product text is escaped before it could be taken for one.
+        cls.tricky = Product.objects.create(category=category, name='<csrf-token/>',
+                                            description='__csrf_token_placeholder__', price=Decimal('1.00'), stock=5)
+        cls.staff = get_user_model().objects.create_user('staff', password='secret', is_staff=True)
+
+    def setUp(self):
+        product_card_cache.reset_card_cache_stats()
+        product_cache.invalidate_products(product.id for product in self.products + [self.tricky])
+
+    def stats(self):
+        client = Client()
+        client.force_login(self.staff)
+        return client.get(reverse('catalog:card_cache_stats')).json()
+
+    def token(self, response):
+        tokens = set(re.findall(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()))
+        self.assertEqual(len(tokens), 1)
+        return tokens.pop()
+
+    def test_cards_are_rendered_once_and_reused_across_requests(self):
+        self.client.get(reverse('catalog:product_list'))
+        self.assertEqual((self.stats()['hits'], self.stats()['misses']), (0, 4))
+        Client().get(reverse('catalog:product_list'))
+        self.assertEqual(self.stats(), {'hits': 4, 'misses': 4, 'hit_ratio': 0.5})
+
+    def test_each_request_gets_its_own_csrf_token(self):
+        first, second = Client(enforce_csrf_checks=True), Client(enforce_csrf_checks=True)
+        first_page = first.get(reverse('catalog:product_list'))
+        second_page = second.get(reverse('catalog:product_list'))
+        self.assertNotEqual(self.token(first_page), self.token(second_page))
+        self.assertNotContains(second_page, product_card_cache.CSRF_PLACEHOLDER)
+        self.assertContains(second_page, '&lt;csrf-token/&gt;')
+        self.assertContains(second_page, '__csrf_token_placeholder__')
+
+        response = second.post(reverse('cart:cart_add', args=[self.products[0].id]),
+                               {'quantity': 1, 'csrfmiddlewaretoken': self.token(second_page)})
+        self.assertEqual(response.status_code, 302)
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def render(self, size, widths):
+        source = os.path.join(self.tmp.name, 'bread.png')
+        Image.new('RGBA', size, (200, 120, 40, 128)).save(source)
+        targets = {width: {fmt: os.path.join(self.tmp.name, f'bread__w{width}.{fmt}')
+                           for fmt in image_derivatives.DERIVATIVE_FORMATS}
+                   for width in widths}
+        return image_derivatives.render_derivatives(source, targets), targets
+
+    def test_render_writes_every_width_up_to_the_original(self):
+        written, targets = self.render((700, 350), (320, 640, 1024))
+        self.assertEqual(written, [320, 640])
+        for width in written:
+            for fmt, path in targets[width].items():
+                with Image.open(path) as image:
+                    self.assertEqual(image.size, (width, width // 2))
+                    self.assertEqual(image.format, image_derivatives.DERIVATIVE_FORMATS[fmt][0])
+        self.assertFalse(os.path.exists(targets[1024]['webp']))
+
+    def test_image_narrower_than_every_width_gets_no_derivatives(self):
+        written, targets = self.render((200, 200), (320, 640))
+        self.assertEqual(written, [])
+        self.assertEqual(os.listdir(self.tmp.name), ['bread.png'])
+
+    def test_variants_of_a_replaced_image_are_not_stored(self):
+        product = Product.objects.create(category=Category.objects.create(name='Bread'), name='Loaf',
+                                         price=Decimal('2.00'), image='products/new.jpg')
+        self.assertFalse(image_derivatives.store_variants(product.pk, 'products/old.jpg', [320]))
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, [])
+
+        self.assertTrue(image_derivatives.store_variants(product.pk, 'products/new.jpg', [320, 640]))
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, [320, 640])
+        self.assertEqual(image_derivatives.get_srcset(product, 'webp'),
+                         '/media/products/new__w320.webp 320w, /media/products/new__w640.webp 640w')
+        self.assertEqual(image_derivatives.get_srcset(product, 'jpeg'),
+                         '/media/products/new__w320.jpg 320w, /media/products/new__w640.jpg 640w')
+
+
+def facet_cells():
+    return set(ProductFacetCount.objects.filter(count__gt=0)
+               .values_list('category_id', 'price_bucket', 'in_stock', 'count'))
+
+
+class CatalogImportTests(TestCase):
+    def setUp(self):
+        self.bread = Category.objects.create(name='Bread')
+        self.cakes = Category.objects.create(name='Cakes')
+        self.untouched = Category.objects.create(name='Pies')
+        Product.objects.create(category=self.untouched, name='Apple Pie', price=Decimal('7.00'), stock=3)
+
+    def rows(self, category='Bread', stock=5, price='2.50'):
+        return [{'sku': f'SKU-{i}', 'name': f'Loaf {i}', 'category': category, 'price': price, 'stock': stock}
+                for i in range(6)]
+
+    def test_non_finite_price_is_reported_not_raised(self):
+        rows = self.rows() + [{'sku': 'BAD-1', 'name': 'Ghost', 'category': 'Bread', 'price': 'NaN'},
+                              {'sku': 'BAD-2', 'name': 'Ghost', 'category': 'Bread', 'price': '-Infinity'}]
+        report = CatalogImporter(batch_size=4).run(rows)
+        self.assertEqual((report.created, report.skipped), (6, 2))
+        self.assertEqual(len(report.errors), 2)
+        self.assertFalse(Product.objects.filter(sku__startswith='BAD').exists())
+
+    def test_values_the_model_fields_reject_are_reported_per_row(self):
+        bad = [
+            {'price': '123456789.00'},    # more than max_digits
+            {'price': '2.505'},           # more than decimal_places
+            {'price': '-1'},
+            {'stock': '3.0'},
+            {'stock': 3.0},
+            {'stock': 2.5},
+            {'stock': True},
+            {'stock': False},
+            {'stock': '-2'},
+        ]
+        rows = self.rows() + [{'sku': f'BAD-{i}', 'name': 'Ghost', 'category': 'Bread', 'price': '2.50', **values}
+                              for i, values in enumerate(bad)]
+        report = CatalogImporter(batch_size=4).run(rows)
+        self.assertEqual((report.created, report.skipped), (6, len(bad)))
+        self.assertEqual(len(report.errors), len(bad))
+        self.assertFalse(Product.objects.filter(sku__startswith='BAD').exists())
+
+    def test_whole_number_stock_is_accepted_as_int_or_string(self):
+        rows = self.rows()
+        rows[0]['stock'], rows[1]['stock'], rows[2]['stock'] = '7', 8, ''
+        report = CatalogImporter().run(rows)
+        self.assertEqual(report.errors, [])
+        self.assertEqual(list(Product.objects.filter(sku__in=['SKU-0', 'SKU-1', 'SKU-2'])
+                              .order_by('sku').values_list('stock', flat=True)), [7, 8, 0])
+
+    def test_batches_recount_only_their_categories(self):
+        CatalogImporter(batch_size=4).run(self.rows())
+        price_version = get_version(PRICE_VERSION)
+
+        # Move everything to Cakes and sell out: Bread and Cakes change, Pies must not be touched.
+        with CaptureQueriesContext(connection) as ctx:
+            report = CatalogImporter(batch_size=4).run(self.rows(category='Cakes', stock=0))
+        self.assertEqual(report.updated, 6)
+        deletes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('DELETE FROM "catalog_productfacetcount"')]
+        self.assertEqual(len(deletes), report.batches)
+        for sql in deletes:
+            self.assertIn(' IN ', sql)
+            self.assertNotIn(str(self.untouched.id), re.findall(r'\d+', sql.split(' IN ', 1)[1]))
+
+        # Only stock and category moved, so carts need no re-pricing.
+        self.assertEqual(get_version(PRICE_VERSION), price_version)
+        incremental = facet_cells()
+        catalog_facets.rebuild_facet_counts()
+        self.assertEqual(incremental, facet_cells())
+
+    def test_price_change_bumps_price_version(self):
+        CatalogImporter().run(self.rows())
+        price_version = get_version(PRICE_VERSION)
+        with self.captureOnCommitCallbacks(execute=True):
+            CatalogImporter().run(self.rows(price='3.10'))
+        self.assertNotEqual(get_version(PRICE_VERSION), price_version)
+
+
+class FacetCountTests(TestCase):
+    def test_incremental_counts_match_a_full_rebuild(self):
+        rng = random.Random(7)
+        categories = [Category.objects.create(name=f'Shelf {i}') for i in range(3)]
+        products = []
+        for step in range(120):
+            action = rng.random()
+            if action < 0.35 or not products:
+                products.append(Product.objects.create(
+                    category=rng.choice(categories), name=f'Item {step}', price=Decimal(rng.choice(['1', '7', '15', '60'])),
+                    stock=rng.choice([0, 3]), available=rng.random() < 0.8,
+                ))
+            elif action < 0.9:
+                product = Product.objects.get(pk=rng.choice(products).pk)
+                setattr(product, *rng.choice([
+                    ('category', rng.choice(categories)),
+                    ('price', Decimal(rng.choice(['2', '9', '25', '99']))),
+                    ('stock', rng.choice([0, 4])),
+                    ('available', rng.random() < 0.5),
+                ]))
+                product.save()
+            else:
+                # Deleted the way the admin does it, from a freshly loaded row.
+                Product.objects.get(pk=products.pop(rng.randrange(len(products))).pk).delete()
+
+        incremental = facet_cells()
+        self.assertTrue(incremental)
+        catalog_facets.rebuild_facet_counts()
+        self.assertEqual(incremental, facet_cells())
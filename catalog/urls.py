@@ -5,6 +5,8 @@ app_name = 'catalog'
 
 urlpatterns = [
     path('', views.product_list, name='product_list'),
+    path('search/', views.product_search, name='product_search'),
     path('category/<slug:category_slug>/', views.product_list, name='product_list_by_category'),
     path('product/<int:id>/<slug:slug>/', views.product_detail, name='product_detail'),
+    path('admin/card-cache-stats/', views.card_cache_stats, name='card_cache_stats'),
 ]
\ No newline at end of file
@@ -1,47 +1,117 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, JsonResponse, QueryDict
 from django.shortcuts import render, get_object_or_404
+from django.views.decorators.http import condition
 
+from cart.cart import get_cart
 from cart.forms import CartAddProductForm
+from services.cache_versions import get_versions, CATALOG_VERSION
+from services.catalog_facets import compute_facets, filter_products
+from services.category_tree import CATEGORY_TREE_VERSION
+from services.pagination import KeysetPaginator
+from services.product_cache import get_product_or_404
+from services.product_search import search_products
+from services.product_card_cache import get_card_cache_stats, render_product_cards
 from .models import Category, Product
 
 
+def catalog_etag(request, *args, **kwargs):
+    """
+    Validator for catalog pages built only from cached counters, so a 304 costs no
+    catalog queries. The cart badge and CSRF cookie are part of the page too,
+    which is why there is no Last-Modified: a date cannot cover them.
+    """
+    versions = get_versions(CATALOG_VERSION, CATEGORY_TREE_VERSION)
+    parts = [
+        versions[CATALOG_VERSION],
+        versions[CATEGORY_TREE_VERSION],
+        len(get_cart(request)),
+        request.META.get('CSRF_COOKIE', ''),
+    ]
+    return hashlib.md5(':'.join(str(p) for p in parts).encode()).hexdigest()
+
+
+def _facet_filters(request):
+    try:
+        price_bucket = int(request.GET['price'])
+        if not 0 <= price_bucket < len(settings.CATALOG_PRICE_BUCKETS):
+            price_bucket = None
+    except (KeyError, ValueError):
+        price_bucket = None
+    in_stock_only = request.GET.get('in_stock') == '1'
+    return price_bucket, in_stock_only
+
+
+@condition(etag_func=catalog_etag)
 def product_list(request, category_slug=None):
     current_category = None
-    categories = Category.objects.filter(
-        parent__isnull=True)
-
     products = Product.objects.filter(available=True)
 
     if category_slug:
         current_category = get_object_or_404(Category, slug=category_slug)
-        category_ids_to_filter = [current_category.id]
+        products = products.filter(
+            category__in=Category.objects.subtree(current_category).values('id')
+        )
 
-        def get_all_children_ids(category):
-            ids = []
-            for child in category.children.all():
-                ids.append(child.id)
-                ids.extend(get_all_children_ids(child))
-            return ids
+    price_bucket, in_stock_only = _facet_filters(request)
+    products = filter_products(products, price_bucket, in_stock_only)
+    filter_query = QueryDict(mutable=True)
+    if price_bucket is not None:
+        filter_query['price'] = price_bucket
+    if in_stock_only:
+        filter_query['in_stock'] = '1'
 
-        category_ids_to_filter.extend(get_all_children_ids(current_category))
-
-        products = products.filter(category_id__in=category_ids_to_filter)
+    paginator = KeysetPaginator(products, ordering=Product._meta.ordering,
+                                per_page=settings.CATALOG_PAGE_SIZE, salt='catalog.product_list')
+    page = paginator.get_page(request.GET.get('cursor'))
 
     context = {
         'current_category': current_category,
-        'categories': Category.objects.all(),
-        'products': products
+        'products': page,
+        'product_cards': render_product_cards(request, page),
+        'page': page,
+        'facets': compute_facets(current_category, price_bucket, in_stock_only),
+        'filter_query': filter_query.urlencode(),
     }
     return render(request, 'catalog/product/list.html', context)
 
 
+def product_search(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        page_number = int(request.GET.get('page', 1))
+    except ValueError:
+        page_number = 1
+
+    page = search_products(query, page=page_number, per_page=settings.CATALOG_PAGE_SIZE) if query else None
+
+    context = {
+        'query': query,
+        'products': page,
+        'product_cards': render_product_cards(request, page) if page else '',
+        'page': page,
+    }
+    return render(request, 'catalog/product/search.html', context)
+
+
+@condition(etag_func=catalog_etag)
 def product_detail(request, id, slug):
-    product = get_object_or_404(Product, id=id, slug=slug, available=True)
-    categories = Category.objects.all()
+    product = get_product_or_404(id)
+    if product.slug != slug or not product.available:
+        raise Http404("No Product matches the given query.")
     cart_add_form = CartAddProductForm()
 
     context = {
         'product': product,
-        'categories': categories,
         'cart_add_form': cart_add_form,
     }
-    return render(request, 'catalog/product/detail.html', context)
\ No newline at end of file
+    return render(request, 'catalog/product/detail.html', context)
+
+
+@staff_member_required
+def card_cache_stats(request):
+    """Product card cache hits, misses and hit ratio, as JSON."""
+    return JsonResponse(get_card_cache_stats())
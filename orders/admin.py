@@ -1,5 +1,7 @@
-from django.contrib import admin
-from .models import Order, OrderItem
+from django.contrib import admin, messages
+from django.utils import timezone
+from services.order_state_machine import bulk_transition
+from .models import Order, OrderEvent, OrderItem
 
 
 class OrderItemInline(admin.TabularInline):
@@ -22,6 +24,7 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ['status', 'created_at']
     search_fields = ['id', 'first_name', 'last_name', 'email']
     inlines = [OrderItemInline]
+    actions = ['process_next_step', 'cancel_orders']
 
     add_fieldsets = (
         (None, {
@@ -61,6 +64,22 @@ class OrderAdmin(admin.ModelAdmin):
 
     final_total_price_display.short_description = 'Total Price'
 
+    def _bulk_transition(self, request, queryset, action):
+        result = bulk_transition(queryset.values_list('id', flat=True), action)
+        for status, ids in result.moved.items():
+            self.message_user(request, f"{len(ids)} orders moved to {status}.")
+        if result.skipped:
+            skipped = ', '.join(f"#{order_id} ({reason})" for order_id, reason in sorted(result.skipped.items()))
+            self.message_user(request, f"Skipped: {skipped}", messages.WARNING)
+
+    @admin.action(description='Advance selected orders to their next step')
+    def process_next_step(self, request, queryset):
+        self._bulk_transition(request, queryset, 'process_next_step')
+
+    @admin.action(description='Cancel selected orders')
+    def cancel_orders(self, request, queryset):
+        self._bulk_transition(request, queryset, 'cancel_order')
+
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
@@ -96,4 +115,21 @@ class OrderItemAdmin(admin.ModelAdmin):
             return format_html('<a href="{}">{}</a>', link, obj.product.name)
         return "N/A"
 
-    product_link.short_description = 'Product'
\ No newline at end of file
+    product_link.short_description = 'Product'
+
+
+@admin.register(OrderEvent)
+class OrderEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'order', 'event_type', 'status', 'attempts', 'available_at', 'processed_at']
+    list_filter = ['status', 'event_type']
+    search_fields = ['order__id']
+    raw_id_fields = ['order']
+    readonly_fields = ['created_at', 'processed_at', 'delivered_to', 'last_error']
+    actions = ['requeue']
+
+    @admin.action(description='Requeue selected events for delivery')
+    def requeue(self, request, queryset):
+        count = queryset.exclude(status=OrderEvent.DONE).update(
+            status=OrderEvent.PENDING, attempts=0, available_at=timezone.now(), processed_at=None
+        )
+        self.message_user(request, f"{count} events requeued.")
@@ -10,7 +10,8 @@ class OrdersConfig(AppConfig):
             get_order_notifier,
             EmailNotificationObserver,
             AdminNotificationObserver,
-            InventoryAdjustmentObserver
+            InventoryAdjustmentObserver,
+            SalesRollupObserver
         )
 
         notifier = get_order_notifier()
@@ -21,5 +22,7 @@ class OrdersConfig(AppConfig):
             notifier.attach(AdminNotificationObserver())
         if not any(isinstance(obs, InventoryAdjustmentObserver) for obs in notifier._observers):
             notifier.attach(InventoryAdjustmentObserver())
+        if not any(isinstance(obs, SalesRollupObserver) for obs in notifier._observers):
+            notifier.attach(SalesRollupObserver())
 
         print("OrdersConfig: Observers attached to OrderNotifier.")
\ No newline at end of file
@@ -1,5 +1,8 @@
+from datetime import datetime, time, timedelta
+
 from django import forms
-from .models import Order
+from django.utils import timezone
+from .models import ORDER_STATUS_CHOICES, Order, SalesRollup
 
 class OrderCreateForm(forms.ModelForm):
     promo_code = forms.CharField(
@@ -16,4 +19,68 @@ class OrderCreateForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         for field_name, field in self.fields.items():
-            field.widget.attrs.update({'class': 'form-control mb-2'})
\ No newline at end of file
+            field.widget.attrs.update({'class': 'form-control mb-2'})
+
+class OrderListFilterForm(forms.Form):
+    status = forms.ChoiceField(choices=[('', 'All statuses')] + ORDER_STATUS_CHOICES, required=False)
+    email = forms.EmailField(required=False)
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            field.widget.attrs.update({'class': 'form-control form-control-sm'})
+
+    def filter(self, orders):
+        """
+        Narrow ``orders`` by the filters that validated; invalid ones are shown
+        as errors and ignored. Status and email are equality matches so they can
+        use the (status, created_at) and (email, created_at) indexes; the dates
+        become a half-open created_at range.
+        """
+        if not self.is_bound:
+            return orders
+        self.is_valid()
+        data = self.cleaned_data
+        if data.get('status'):
+            orders = orders.filter(status=data['status'])
+        if data.get('email'):
+            orders = orders.filter(email=data['email'])
+        if data.get('date_from'):
+            orders = orders.filter(created_at__gte=_start_of_day(data['date_from']))
+        if data.get('date_to'):
+            orders = orders.filter(created_at__lt=_start_of_day(data['date_to'] + timedelta(days=1)))
+        return orders
+
+
+class SalesReportForm(forms.Form):
+    MAX_HOURLY_DAYS = 31
+
+    dimension = forms.ChoiceField(choices=SalesRollup.DIMENSION_CHOICES, initial=SalesRollup.TOTAL)
+    hourly = forms.BooleanField(required=False, label="By hour")
+    date_from = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def __init__(self, data=None, **kwargs):
+        today = timezone.localdate()
+        # Default to the last 30 days when the page is opened without a query.
+        data = data or {'dimension': SalesRollup.TOTAL, 'date_from': today - timedelta(days=29), 'date_to': today}
+        super().__init__(data, **kwargs)
+        for name, field in self.fields.items():
+            if name != 'hourly':
+                field.widget.attrs.update({'class': 'form-control form-control-sm'})
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from, date_to = cleaned_data.get('date_from'), cleaned_data.get('date_to')
+        if date_from and date_to:
+            if date_from > date_to:
+                raise forms.ValidationError("The start date must not be after the end date.")
+            if cleaned_data.get('hourly') and (date_to - date_from).days >= self.MAX_HOURLY_DAYS:
+                raise forms.ValidationError(f"Hourly reports cover at most {self.MAX_HOURLY_DAYS} days.")
+        return cleaned_data
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
@@ -0,0 +1,86 @@
+import statistics
+import time
+from decimal import Decimal
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import setup_databases, teardown_databases
+
+from cart.cart import Cart
+from catalog.models import Category, Product
+from services.order_builder import OrderBuilder
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class Command(BaseCommand):
+    help = ("Place orders through OrderBuilder.build and report latency, statements and how long "
+            "the transaction holds write locks. Runs against a throwaway test database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=50)
+        parser.add_argument('--lines', type=int, default=30, help="Cart lines per order.")
+
+    def _cart(self, products):
+        request = RequestFactory().post('/orders/create/')
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        cart = Cart(request)
+        with cart.batch():
+            for product in products:
+                cart.add(product, quantity=1)
+        return cart
+
+    def _place(self, products, lock_hold):
+        first_write, committed, statements = [], [], []
+
+        def track_statements(execute, sql, params, many, context):
+            statements.append(sql)
+            if not first_write and sql.lstrip().upper().startswith(WRITE_PREFIXES):
+                first_write.append(time.perf_counter())
+                # Runs right after COMMIT, ahead of the callbacks the build itself registers.
+                transaction.on_commit(lambda: committed.append(time.perf_counter()))
+            return execute(sql, params, many, context)
+
+        builder = OrderBuilder().set_customer_details(
+            first_name='Bench', last_name='Mark', email='bench@example.com',
+            address='1 Oven St', postal_code='0000', city='Crumbs',
+        ).set_cart(self._cart(products))
+
+        with connection.execute_wrapper(track_statements):
+            started = time.perf_counter()
+            order = builder.build()
+            finished = time.perf_counter()
+        lock_hold.append((committed[0] - first_write[0]) * 1000)
+        return order, (finished - started) * 1000, len(statements)
+
+    def handle(self, *args, **options):
+        # Orders, stock decrements, outbox events and sales rollups all go to a
+        # test database that is dropped afterwards, never to the real data. Nothing
+        # may open ``connection`` before this: with SQLite that alone creates the file.
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self._benchmark(options['orders'], options['lines'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def _benchmark(self, orders, lines):
+        category = Category.objects.create(name='Benchmark checkout')
+        products = [
+            Product.objects.create(category=category, name=f'Benchmark item {i}',
+                                   price=Decimal('2.50') + i, stock=orders * 2)
+            for i in range(lines)
+        ]
+        latencies, lock_hold, statements = [], [], 0
+        for _ in range(orders):
+            _, latency, statements = self._place(products, lock_hold)
+            latencies.append(latency)
+
+        self.stdout.write(f"{orders} orders x {lines} lines")
+        self.stdout.write(f"statements per order:     {statements}")
+        self.stdout.write(f"build latency ms:         median {statistics.median(latencies):.2f}  "
+                          f"max {max(latencies):.2f}")
+        self.stdout.write(f"write lock hold ms:       median {statistics.median(lock_hold):.2f}  "
+                          f"max {max(lock_hold):.2f}")
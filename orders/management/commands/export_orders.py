@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.forms import OrderListFilterForm
+from orders.models import Order
+from services.order_export import FORMATS, ExportProgress, export_rows, render_export
+
+
+class Command(BaseCommand):
+    help = ("Write orders joined with their items as CSV or JSONL, one row per item "
+            "(a single row with empty item columns for an order without items). "
+            "Rows are streamed, so memory use does not depend on the size of the export.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', default='-', help="File to write to; '-' for standard output.")
+        parser.add_argument('--status', default='')
+        parser.add_argument('--email', default='')
+        parser.add_argument('--date-from', default='', help="First day to include, YYYY-MM-DD.")
+        parser.add_argument('--date-to', default='', help="Last day to include, YYYY-MM-DD.")
+        parser.add_argument('--chunk-size', type=int, default=settings.ORDER_EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        # Same filters, and the same meaning of them, as the staff order list.
+        filter_form = OrderListFilterForm({name: options[name] for name in ('status', 'email', 'date_from', 'date_to')})
+        if not filter_form.is_valid():
+            raise CommandError('; '.join(f"--{name.replace('_', '-')}: {' '.join(errors)}"
+                                         for name, errors in filter_form.errors.items()))
+
+        progress = ExportProgress()
+        rows = export_rows(filter_form.filter(Order.objects.all()), options['chunk_size'])
+        lines = render_export(rows, options['format'], progress)
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            # Keep the summary out of the exported data.
+            report = self.stderr
+        else:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines)
+            report = self.stdout
+        report.write(self.style.SUCCESS(f"Exported {progress}."))
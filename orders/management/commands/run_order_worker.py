@@ -0,0 +1,42 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from services.notification_service import get_order_notifier
+from services.order_outbox import claim_batch, process_batch
+
+
+class Command(BaseCommand):
+    help = "Deliver order events from the outbox to the OrderNotifier observers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.ORDER_OUTBOX_BATCH_SIZE)
+        parser.add_argument('--concurrency', type=int, default=settings.ORDER_WORKER_CONCURRENCY,
+                            help="Threads delivering events in parallel.")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain what is due now, then exit.")
+
+    def handle(self, *args, **options):
+        batch_size, once = options['batch_size'], options['once']
+        notifier = get_order_notifier()
+        delivered = failed = 0
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            try:
+                while True:
+                    events = claim_batch(batch_size)
+                    if events:
+                        ok = process_batch(events, executor)
+                        delivered += ok
+                        failed += len(events) - ok
+                        notifier.flush_stats()
+                        self.stdout.write(f"Batch of {len(events)}: {ok} delivered, {len(events) - ok} failed.")
+                    if len(events) < batch_size:
+                        if once:
+                            break
+                        time.sleep(options['poll_interval'])
+            except KeyboardInterrupt:
+                pass
+        self.stdout.write(self.style.SUCCESS(f"Order worker stopped: {delivered} delivered, {failed} failed."))
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_order_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(choices=[('NEW', 'New'), ('PROCESSING', 'Processing'), ('SHIPPED', 'Shipped'), ('COMPLETED', 'Completed'), ('CANCELED', 'Canceled')], max_length=20)),
+                ('to_status', models.CharField(choices=[('NEW', 'New'), ('PROCESSING', 'Processing'), ('SHIPPED', 'Shipped'), ('COMPLETED', 'Completed'), ('CANCELED', 'Canceled')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('order', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='transitions', to='orders.order')),
+            ],
+            options={
+                'verbose_name': 'Order Transition',
+                'verbose_name_plural': 'Order Transitions',
+                'ordering': ('created_at', 'id'),
+                'indexes': [models.Index(fields=['order', 'created_at'], name='orders_transition_order_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:10
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('category', 'Category'), ('product', 'Product')], max_length=10)),
+                ('key', models.PositiveIntegerField(default=0)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('gross', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('discount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('net', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('day', models.DateField()),
+            ],
+            options={
+                'verbose_name': 'Daily Sales',
+                'verbose_name_plural': 'Daily Sales',
+                'ordering': ('day', 'dimension', 'key'),
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('category', 'Category'), ('product', 'Product')], max_length=10)),
+                ('key', models.PositiveIntegerField(default=0)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('gross', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('discount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('net', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('hour', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Hourly Sales',
+                'verbose_name_plural': 'Hourly Sales',
+                'ordering': ('hour', 'dimension', 'key'),
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='counted_in_sales',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='hourlysales',
+            constraint=models.UniqueConstraint(fields=('dimension', 'hour', 'key'), name='orders_hourly_sales_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('dimension', 'day', 'key'), name='orders_daily_sales_unique'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_stock_returned'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ObserverStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('observer', models.CharField(max_length=100)),
+                ('field', models.CharField(max_length=20)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Observer Stat',
+                'verbose_name_plural': 'Observer Stats',
+                'ordering': ('observer', 'field'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='observerstat',
+            constraint=models.UniqueConstraint(fields=('observer', 'field'), name='orders_observer_stat_unique'),
+        ),
+    ]
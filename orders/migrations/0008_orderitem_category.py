@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:32
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def snapshot_categories(apps, schema_editor):
+    # Existing items were counted under their product's current category, so take that one.
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('catalog', 'Product')
+    OrderItem.objects.filter(category__isnull=True).update(
+        category=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('category_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_cache_table'),
+        ('orders', '0007_observer_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='category',
+            field=models.ForeignKey(blank=True, db_constraint=False, editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalog.category'),
+        ),
+        migrations.RunPython(snapshot_categories, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+def merge_observer_rows(apps, schema_editor):
+    # One row per (observer, counter) becomes one row per observer, keeping the first row of each.
+    ObserverStat = apps.get_model('orders', 'ObserverStat')
+    merged = {}
+    for stat in ObserverStat.objects.order_by('observer', 'pk'):
+        row = merged.setdefault(stat.observer, stat)
+        if hasattr(row, stat.field):
+            setattr(row, stat.field, getattr(row, stat.field) + stat.value)
+    ObserverStat.objects.exclude(pk__in=[row.pk for row in merged.values()]).delete()
+    for row in merged.values():
+        row.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_orderitem_category'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='observerstat',
+            name='orders_observer_stat_unique',
+        ),
+        migrations.AddField(
+            model_name='observerstat',
+            name='calls',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='observerstat',
+            name='errors',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='observerstat',
+            name='total_us',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='observerstat',
+            name='le_1',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='observerstat',
+            name='le_5',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='observerstat',
+            name='le_10',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='observerstat',
+            name='le_50',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='observerstat',
+            name='le_100',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='observerstat',
+            name='le_500',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='observerstat',
+            name='le_1000',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='observerstat',
+            name='le_5000',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='observerstat',
+            name='le_inf',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(merge_observer_rows, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='observerstat',
+            name='field',
+        ),
+        migrations.RemoveField(
+            model_name='observerstat',
+            name='value',
+        ),
+        migrations.AlterField(
+            model_name='observerstat',
+            name='observer',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+        migrations.AlterModelOptions(
+            name='observerstat',
+            options={'ordering': ('observer',), 'verbose_name': 'Observer Stat', 'verbose_name_plural': 'Observer Stats'},
+        ),
+    ]
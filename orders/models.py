@@ -1,5 +1,5 @@
 from django.db import models
-from catalog.models import Product
+from catalog.models import Category, Product
 from decimal import Decimal
 
 
@@ -33,10 +33,21 @@ class Order(models.Model):
 
     applied_discount_info = models.CharField(max_length=255, blank=True, null=True)
 
+    # Whether the order's sales are in the rollup tables, see services.sales_rollups.
+    counted_in_sales = models.BooleanField(default=False, editable=False)
+    # Whether a cancellation has put the items back on the shelf, see services.inventory.return_order_stock.
+    stock_returned = models.BooleanField(default=False, editable=False)
+
     class Meta:
-        ordering = ('-created_at',)
+        ordering = ('-created_at', '-id')
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
+        # Serve the staff order list, unfiltered or by status or email, newest first.
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='orders_order_created_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='orders_order_status_idx'),
+            models.Index(fields=['email', 'created_at', 'id'], name='orders_order_email_idx'),
+        ]
 
     def __str__(self):
         return f'Order {self.id} - {self.first_name} {self.last_name}'
@@ -51,6 +62,11 @@ class Order(models.Model):
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, related_name='order_items', on_delete=models.CASCADE)
+    # The product's category when the order was placed, so the sales rollups count
+    # (and take back out) the sale under the same category after the product moves.
+    # A plain reference, so the id outlives a deleted category like the rollup keys do.
+    category = models.ForeignKey(Category, related_name='+', null=True, blank=True, editable=False,
+                                 on_delete=models.DO_NOTHING, db_constraint=False)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField(default=1)
 
@@ -64,4 +80,151 @@ class OrderItem(models.Model):
     def get_cost(self):
         if self.price is not None and self.quantity is not None:
             return self.price * self.quantity
-        return Decimal('0.00')
\ No newline at end of file
+        return Decimal('0.00')
+
+class OrderEvent(models.Model):
+    """
+    Transactional outbox: one row per order event, written in the same
+    transaction as the order change and delivered to the OrderNotifier
+    observers by ``manage.py run_order_worker``.
+    """
+    PENDING = 'PENDING'
+    DONE = 'DONE'
+    DEAD = 'DEAD'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (DONE, 'Delivered'),
+        (DEAD, 'Dead-lettered'),
+    ]
+
+    order = models.ForeignKey(Order, related_name='events', on_delete=models.CASCADE)
+    event_type = models.CharField(max_length=50)
+    # Keyword arguments for the observers; always has 'status' and 'previous_status'.
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField()
+    # Observers that already handled the event, skipped when it is retried.
+    delivered_to = models.JSONField(default=list, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Order Event'
+        verbose_name_plural = 'Order Events'
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='orders_event_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.event_type} for order {self.order_id} ({self.status})'
+
+
+class OrderTransition(models.Model):
+    """Append-only log of status changes, one row per successful transition."""
+    # Indexed through orders_transition_order_idx, whose leading column is order.
+    order = models.ForeignKey(Order, related_name='transitions', on_delete=models.CASCADE, db_index=False)
+    from_status = models.CharField(max_length=20, choices=ORDER_STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=ORDER_STATUS_CHOICES)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ('created_at', 'id')
+        verbose_name = 'Order Transition'
+        verbose_name_plural = 'Order Transitions'
+        indexes = [
+            models.Index(fields=['order', 'created_at'], name='orders_transition_order_idx'),
+        ]
+
+    def __str__(self):
+        return f'Order {self.order_id}: {self.from_status} -> {self.to_status}'
+
+
+class SalesRollup(models.Model):
+    """
+    Sales of one period, summed over all orders (``dimension`` TOTAL, ``key`` 0),
+    one category or one product (``key`` is its id). Canceled orders are not
+    counted. Maintained by services.sales_rollups.
+    """
+    TOTAL = 'total'
+    CATEGORY = 'category'
+    PRODUCT = 'product'
+    DIMENSION_CHOICES = [
+        (TOTAL, 'Total'),
+        (CATEGORY, 'Category'),
+        (PRODUCT, 'Product'),
+    ]
+
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    # A plain id rather than a foreign key, so history outlives deleted products and categories.
+    key = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    gross = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    discount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    net = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        abstract = True
+
+
+class DailySales(SalesRollup):
+    day = models.DateField()
+
+    class Meta:
+        ordering = ('day', 'dimension', 'key')
+        verbose_name = 'Daily Sales'
+        verbose_name_plural = 'Daily Sales'
+        # Also the index of the reports, which read one dimension over a range of days.
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'day', 'key'], name='orders_daily_sales_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.day} {self.dimension} {self.key}'
+
+
+class HourlySales(SalesRollup):
+    hour = models.DateTimeField()
+
+    class Meta:
+        ordering = ('hour', 'dimension', 'key')
+        verbose_name = 'Hourly Sales'
+        verbose_name_plural = 'Hourly Sales'
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'hour', 'key'], name='orders_hourly_sales_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.hour:%Y-%m-%d %H:00} {self.dimension} {self.key}'
+
+
+class ObserverStat(models.Model):
+    """
+    The counters of one OrderNotifier observer, summed over every process that
+    flushed its stats, see services.notification_service. ``le_<ms>`` counts
+    the calls that took at most that long, ``le_inf`` the slower ones.
+    """
+    observer = models.CharField(max_length=100, unique=True)
+    calls = models.BigIntegerField(default=0)
+    errors = models.BigIntegerField(default=0)
+    total_us = models.BigIntegerField(default=0)
+    le_1 = models.BigIntegerField(default=0)
+    le_5 = models.BigIntegerField(default=0)
+    le_10 = models.BigIntegerField(default=0)
+    le_50 = models.BigIntegerField(default=0)
+    le_100 = models.BigIntegerField(default=0)
+    le_500 = models.BigIntegerField(default=0)
+    le_1000 = models.BigIntegerField(default=0)
+    le_5000 = models.BigIntegerField(default=0)
+    le_inf = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ('observer',)
+        verbose_name = 'Observer Stat'
+        verbose_name_plural = 'Observer Stats'
+
+    def __str__(self):
+        return f'{self.observer}: {self.calls} calls, {self.errors} errors'
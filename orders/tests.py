@@ -1,3 +1,623 @@
-from django.test import TestCase
+import csv
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
 
-# Create your tests here.
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.models import Category, Product
+from services import product_cache
+from services.cache_versions import PRICE_VERSION, bump_version
+from services.category_tree import get_category_tree
+from services.notification_service import OrderObserver, get_order_notifier
+from services.order_outbox import claim_batch, deliver_event, process_batch, publish_order_event
+from services.order_state_machine import STATE_CLASSES, OrderContext, StaleOrderStateError, bulk_transition
+from .models import DailySales, HourlySales, ObserverStat, Order, OrderEvent, OrderItem, OrderTransition, SalesRollup
+
+
+class OrderTransitionStressTests(TransactionTestCase):
+    THREADS = 12
+    ATTEMPTS = 8
+
+    def setUp(self):
+        self.order = Order.objects.create(first_name='Ann', last_name='Baker', email='ann@example.com',
+                                          address='1 Oven St', postal_code='0000', city='Crumbs')
+
+    def attempt(self, action):
+        # SQLite serializes writers by failing the loser with "locked"; keep retrying like a client would.
+        for _ in range(50):
+            try:
+                getattr(OrderContext(Order.objects.get(pk=self.order.pk)), action)()
+                return 'done'
+            except StaleOrderStateError:
+                return 'stale'
+            except OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                time.sleep(0.01)
+        return 'locked'
+
+    def hammer(self, seed, barrier, outcomes):
+        rng = random.Random(seed)
+        try:
+            barrier.wait()
+            for _ in range(self.ATTEMPTS):
+                outcomes.append(self.attempt(rng.choice(['process_next_step', 'cancel_order'])))
+        finally:
+            connections.close_all()
+
+    def test_concurrent_transitions_form_a_single_legal_history(self):
+        barrier = threading.Barrier(self.THREADS)
+        outcomes = []
+        threads = [threading.Thread(target=self.hammer, args=(seed, barrier, outcomes))
+                   for seed in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(outcomes), self.THREADS * self.ATTEMPTS)
+        self.assertNotIn('locked', outcomes)
+        history = list(OrderTransition.objects.filter(order=self.order).values_list('from_status', 'to_status'))
+        self.assertTrue(history)
+
+        # Every step starts where the previous one ended and is a move its state allows.
+        status = 'NEW'
+        for from_status, to_status in history:
+            self.assertEqual(from_status, status)
+            state_class = STATE_CLASSES[from_status]
+            self.assertIn(to_status, (state_class.next_status, state_class.cancel_status))
+            status = to_status
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, status)
+        self.assertEqual(OrderEvent.objects.filter(order=self.order).count(), len(history))
+
+    def test_transition_decided_from_an_outdated_status_is_refused(self):
+        first = OrderContext(Order.objects.get(pk=self.order.pk))
+        second = OrderContext(Order.objects.get(pk=self.order.pk))
+        first.process_next_step()
+        with self.assertRaises(StaleOrderStateError):
+            second.cancel_order()
+
+        # The loser sees the winner's status and left no trace of its own.
+        self.assertEqual(second.order.status, 'PROCESSING')
+        self.assertEqual(list(OrderTransition.objects.values_list('from_status', 'to_status')),
+                         [('NEW', 'PROCESSING')])
+        self.assertEqual(OrderEvent.objects.filter(order=self.order).count(), 1)
+
+
+class BulkTransitionTests(TestCase):
+    def setUp(self):
+        self.orders = {
+            status: Order.objects.create(first_name='Ann', last_name='Baker', email='ann@example.com',
+                                         address='1 Oven St', postal_code='0000', city='Crumbs', status=status)
+            for status in STATE_CLASSES
+        }
+
+    def ids(self, *statuses):
+        return [self.orders[status].id for status in statuses]
+
+    def test_orders_the_action_does_not_apply_to_are_skipped_with_a_reason(self):
+        missing = max(self.ids(*STATE_CLASSES)) + 1
+        result = bulk_transition(self.ids(*STATE_CLASSES) + [missing], 'cancel_order')
+
+        self.assertEqual(sorted(result.moved['CANCELED']), self.ids('NEW', 'PROCESSING'))
+        self.assertEqual(result.skipped, {
+            self.orders['SHIPPED'].id: 'cannot cancel order from SHIPPED',
+            self.orders['COMPLETED'].id: 'cannot cancel order from COMPLETED',
+            self.orders['CANCELED'].id: 'cannot cancel order from CANCELED',
+            missing: 'not found',
+        })
+        self.assertEqual(
+            set(OrderEvent.objects.values_list('order_id', 'event_type')),
+            {(self.orders['NEW'].id, 'canceled_with_stock_return'), (self.orders['PROCESSING'].id, 'status_changed')},
+        )
+        self.assertEqual(OrderTransition.objects.count(), 2)
+
+        result = bulk_transition(self.ids('COMPLETED'), 'process_next_step')
+        self.assertEqual(result.skipped, {self.orders['COMPLETED'].id: 'cannot process next step from COMPLETED'})
+
+    def test_order_changed_between_read_and_update_is_skipped(self):
+        second = Order.objects.create(first_name='Cy', last_name='Dough', email='cy@example.com',
+                                      address='2 Rye Rd', postal_code='1111', city='Crumbs')
+        raced = self.orders['NEW']
+
+        def move_first(execute, sql, params, many, context):
+            # Someone else processes one of the orders right before the bulk UPDATE runs.
+            if sql.startswith('UPDATE "orders_order"') and not hooked:
+                hooked.append(sql)
+                Order.objects.filter(pk=raced.pk).update(status='PROCESSING')
+            return execute(sql, params, many, context)
+
+        hooked = []
+        with connection.execute_wrapper(move_first):
+            result = bulk_transition([raced.id, second.id], 'process_next_step')
+        self.assertEqual(result.moved, {'PROCESSING': [second.id]})
+        self.assertEqual(result.skipped, {raced.id: 'changed concurrently'})
+        self.assertEqual(list(OrderEvent.objects.values_list('order_id', flat=True)), [second.id])
+
+
+@override_settings(ORDER_ADMIN_PAGE_SIZE=4)
+class StaffOrderListTests(TestCase):
+    # Session and user lookups, then one query for the list page and three for the detail page.
+    LIST_QUERY_BUDGET = 3
+    DETAIL_QUERY_BUDGET = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Pastry')
+        cls.products = [Product.objects.create(category=category, name=f'Tart {i}', price=Decimal('3.00'), stock=50)
+                        for i in range(3)]
+        cls.staff = get_user_model().objects.create_user('staff', password='secret', is_staff=True)
+        # Ten orders over five days, two per day at the same instant so the id breaks the tie.
+        for i in range(10):
+            order = Order.objects.create(first_name='Cy', last_name='Dough', email=f'cy{i % 2}@example.com',
+                                         address='2 Rye Rd', postal_code='1111', city='Crumbs',
+                                         status='NEW' if i % 3 else 'SHIPPED')
+            Order.objects.filter(pk=order.pk).update(
+                created_at=datetime(2026, 3, 1 + i // 2, 12, tzinfo=dt_timezone.utc))
+            OrderItem.objects.bulk_create([OrderItem(order=order, product=product, price=product.price, quantity=1)
+                                           for product in cls.products[:1 + i % 3]])
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+        # The navigation menu is cached; keep it out of the per-page budget.
+        get_category_tree()
+
+    def walk(self, **filters):
+        """Follow the Older links from the first page; return the order ids in display order."""
+        ids, cursor = [], None
+        while True:
+            params = dict(filters, **({'cursor': cursor} if cursor else {}))
+            with self.assertNumQueries(self.LIST_QUERY_BUDGET):
+                response = self.client.get(reverse('orders:admin_order_list'), params)
+            page = response.context['page']
+            ids += [order.id for order in page]
+            if not page.has_next:
+                return ids
+            cursor = page.next_cursor
+
+    def expected(self, **filters):
+        return list(Order.objects.filter(**filters).order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def test_keyset_pages_cover_every_order_once_within_budget(self):
+        self.assertEqual(self.walk(), self.expected())
+
+    def test_filters(self):
+        self.assertEqual(self.walk(status='SHIPPED'), self.expected(status='SHIPPED'))
+        self.assertEqual(self.walk(email='cy1@example.com'), self.expected(email='cy1@example.com'))
+        self.assertEqual(self.walk(date_from='2026-03-02', date_to='2026-03-03'),
+                         self.expected(created_at__date__range=('2026-03-02', '2026-03-03')))
+
+    def test_filtered_list_uses_composite_indexes(self):
+        for filters, index in (({'status': 'NEW'}, 'orders_order_status_idx'),
+                               ({'email': 'cy0@example.com'}, 'orders_order_email_idx')):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(reverse('orders:admin_order_list'), filters)
+            sql = next(q['sql'] for q in ctx.captured_queries if 'FROM "orders_order"' in q['sql'])
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = ' '.join(str(row) for row in cursor.fetchall())
+            self.assertIn(index, plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_detail_query_count_does_not_grow_with_items(self):
+        for order in Order.objects.all():
+            with self.assertNumQueries(self.DETAIL_QUERY_BUDGET):
+                response = self.client.get(reverse('orders:admin_order_detail', args=[order.id]))
+            self.assertContains(response, 'Tart 0')
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('staff', password='secret', is_staff=True))
+        product = Product.objects.create(category=Category.objects.create(name='Bread'), name='Loaf',
+                                         price=Decimal('2.50'))
+        for email in ('ann@example.com', 'cy@example.com'):
+            order = Order.objects.create(first_name='Ann', last_name='Baker', email=email,
+                                         address='1 Oven St', postal_code='0000', city='Crumbs')
+            OrderItem.objects.create(order=order, product=product, price=product.price, quantity=1)
+
+    def export(self, **params):
+        return self.client.get(reverse('orders:admin_order_export'), params)
+
+    def test_filters_narrow_the_export(self):
+        response = self.export(email='cy@example.com', format='jsonl')
+        self.assertEqual(response.status_code, 200)
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(rows), 1)
+        self.assertIn('cy@example.com', rows[0])
+
+    def test_invalid_filters_and_unknown_formats_are_rejected(self):
+        for params, field in (({'email': 'not-an-email'}, 'email'), ({'date_from': '2026-13-45'}, 'date_from'),
+                              ({'status': 'LOST'}, 'status'), ({'format': 'xlsx'}, 'format')):
+            with self.subTest(params=params):
+                response = self.export(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(field, response.json()['errors'])
+
+    def test_orders_without_items_get_a_row(self):
+        Order.objects.create(first_name='Dee', last_name='Empty', email='dee@example.com',
+                             address='3 Crust Ln', postal_code='2222', city='Crumbs')
+        response = self.export(format='jsonl')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[-1]['email'], 'dee@example.com')
+        self.assertIsNone(rows[-1]['item_id'])
+        self.assertIsNone(rows[-1]['product_name'])
+
+    def test_csv_cells_that_look_like_formulas_are_quoted(self):
+        Order.objects.filter(email='cy@example.com').update(first_name='=HYPERLINK("http://x")',
+                                                            last_name='-Baker', city='@Crumbs')
+        response = self.export(email='cy@example.com')
+        header, row = csv.reader(b''.join(response.streaming_content).decode().splitlines())
+        row = dict(zip(header, row))
+        self.assertEqual(row['first_name'], '\'=HYPERLINK("http://x")')
+        self.assertEqual(row['last_name'], "'-Baker")
+        self.assertEqual(row['city'], "'@Crumbs")
+        self.assertEqual(row['price'], '2.50')
+
+        # JSONL is data, not a spreadsheet: left as it is.
+        response = self.export(email='cy@example.com', format='jsonl')
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['last_name'], '-Baker')
+
+
+class BenchmarkCheckoutTests(SimpleTestCase):
+    def test_configured_database_is_never_opened(self):
+        # With SQLite, merely connecting creates the file; the benchmark must only use its test database.
+        database = str(settings.DATABASES['default']['NAME'])
+        before = os.stat(database) if os.path.exists(database) else None
+        subprocess.run([sys.executable, 'manage.py', 'benchmark_checkout', '--orders', '1', '--lines', '1'],
+                       cwd=settings.BASE_DIR, check=True, capture_output=True)
+        after = os.stat(database) if os.path.exists(database) else None
+        self.assertEqual(after and (after.st_size, after.st_mtime_ns), before and (before.st_size, before.st_mtime_ns))
+
+
+class RecordingObserver(OrderObserver):
+    event_types = ('outbox_test',)
+
+    def __init__(self, failures=0):
+        self.calls = 0
+        self.failures = failures
+
+    def update(self, order, event_type, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError(f"failure {self.calls}")
+
+
+class FlakyObserver(RecordingObserver):
+    pass
+
+
+@override_settings(ORDER_OUTBOX_BACKOFF=5, ORDER_OUTBOX_MAX_ATTEMPTS=3, ORDER_OUTBOX_LEASE=60)
+class OrderOutboxTests(TestCase):
+    def setUp(self):
+        # Failing observers are logged with a traceback; keep those out of the test output.
+        logging.disable(logging.ERROR)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.orders = [Order.objects.create(first_name='Ann', last_name='Baker', email='ann@example.com',
+                                            address='1 Oven St', postal_code='0000', city='Crumbs')
+                       for _ in range(2)]
+
+    def attach(self, *observers):
+        notifier = get_order_notifier()
+        for observer in observers:
+            notifier.attach(observer)
+            self.addCleanup(notifier.detach, observer)
+
+    def publish(self, order=None):
+        return publish_order_event(order or self.orders[0], 'outbox_test')
+
+    def make_due(self):
+        OrderEvent.objects.update(available_at=timezone.now() - timedelta(seconds=1))
+
+    def test_failed_delivery_backs_off_exponentially(self):
+        self.attach(FlakyObserver(failures=2))
+        event = self.publish()
+        for attempt, delay in ((1, 5), (2, 10)):
+            self.make_due()
+            before = timezone.now()
+            self.assertFalse(deliver_event(claim_batch(10)[0]))
+            event.refresh_from_db()
+            self.assertEqual((event.status, event.attempts), (OrderEvent.PENDING, attempt))
+            self.assertIn(f'failure {attempt}', event.last_error)
+            self.assertGreaterEqual(event.available_at, before + timedelta(seconds=delay))
+            self.assertEqual(claim_batch(10), [])
+
+        self.make_due()
+        self.assertTrue(deliver_event(claim_batch(10)[0]))
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.last_error), (OrderEvent.DONE, ''))
+
+    def test_event_is_dead_lettered_after_max_attempts(self):
+        self.attach(FlakyObserver(failures=99))
+        event = self.publish()
+        for _ in range(3):
+            self.make_due()
+            deliver_event(claim_batch(10)[0])
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), (OrderEvent.DEAD, 3))
+        self.assertIsNotNone(event.processed_at)
+        self.make_due()
+        self.assertEqual(claim_batch(10), [])
+
+    def test_retry_skips_observers_that_already_handled_the_event(self):
+        steady, flaky = RecordingObserver(), FlakyObserver(failures=1)
+        self.attach(steady, flaky)
+        event = self.publish()
+        deliver_event(claim_batch(10)[0])
+        event.refresh_from_db()
+        self.assertEqual(event.delivered_to, ['RecordingObserver'])
+
+        self.make_due()
+        self.assertTrue(deliver_event(claim_batch(10)[0]))
+        self.assertEqual((steady.calls, flaky.calls), (1, 2))
+
+    def test_only_the_oldest_pending_event_of_an_order_is_claimable(self):
+        self.attach(RecordingObserver())
+        first, second, other = self.publish(), self.publish(), self.publish(self.orders[1])
+        self.assertEqual([event.id for event in claim_batch(10)], [first.id, other.id])
+
+        # The first is leased but still pending, so the second keeps waiting behind it.
+        self.assertEqual(claim_batch(10), [])
+        deliver_event(OrderEvent.objects.get(pk=first.pk))
+        self.assertEqual([event.id for event in claim_batch(10)], [second.id])
+
+    def test_expired_lease_makes_the_event_claimable_again(self):
+        event = self.publish()
+        claimed = claim_batch(10)
+        self.assertEqual([e.id for e in claimed], [event.id])
+        event.refresh_from_db()
+        self.assertGreater(event.available_at, timezone.now() + timedelta(seconds=55))
+        self.assertEqual(claim_batch(10), [])
+
+        # The worker that claimed it died; once the lease runs out another one picks it up.
+        self.make_due()
+        self.assertEqual([e.id for e in claim_batch(10)], [event.id])
+
+
+class CatchAllObserver(RecordingObserver):
+    event_types = None
+
+
+class OrderNotifierTests(TestCase):
+    def setUp(self):
+        self.notifier = get_order_notifier()
+        self.recording, self.flaky, self.catch_all = RecordingObserver(), FlakyObserver(), CatchAllObserver()
+        for observer in (self.recording, self.flaky, self.catch_all):
+            self.notifier.attach(observer)
+            self.addCleanup(self.notifier.detach, observer)
+
+    def test_routes_follow_event_types_and_detach(self):
+        routed = self.notifier.observers_for('outbox_test')
+        self.assertIn(self.recording, routed)
+        self.assertIn(self.catch_all, routed)
+        # Types no observer declared get just the catch-all ones.
+        undeclared = self.notifier.observers_for('outbox_test_undeclared')
+        self.assertIn(self.catch_all, undeclared)
+        self.assertNotIn(self.recording, undeclared)
+
+        self.notifier.detach(self.catch_all)
+        self.assertNotIn(self.catch_all, self.notifier.observers_for('outbox_test'))
+        self.assertNotIn(self.catch_all, self.notifier.observers_for('outbox_test_undeclared'))
+        self.notifier.detach(self.recording)
+        self.notifier.detach(self.flaky)
+        self.assertEqual(self.notifier.observers_for('outbox_test'),
+                         self.notifier.observers_for('outbox_test_undeclared'))
+
+    def test_flush_is_one_update_per_observer(self):
+        self.notifier.flush_stats()
+        ObserverStat.objects.all().delete()
+        order = Order.objects.create(first_name='Ann', last_name='Baker', email='ann@example.com',
+                                     address='1 Oven St', postal_code='0000', city='Crumbs')
+        self.notifier.deliver(order, 'outbox_test')
+        self.notifier.flush_stats()
+        self.notifier.deliver(order, 'outbox_test')
+        with CaptureQueriesContext(connection) as queries:
+            self.notifier.flush_stats()
+        updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 3)
+
+        stats = self.notifier.get_stats()
+        for name in ('RecordingObserver', 'FlakyObserver', 'CatchAllObserver'):
+            self.assertEqual(stats[name]['calls'], 2)
+            self.assertEqual(sum(stats[name]['latency_ms'].values()), 2)
+
+
+class OrderCancellationTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(category=Category.objects.create(name='Bread'), name='Loaf',
+                                              price=Decimal('2.50'), stock=4)
+        self.order = Order.objects.create(first_name='Ann', last_name='Baker', email='ann@example.com',
+                                          address='1 Oven St', postal_code='0000', city='Crumbs')
+        OrderItem.objects.create(order=self.order, product=self.product, price=Decimal('2.50'), quantity=3)
+
+    def test_redelivered_cancellation_returns_the_stock_once(self):
+        OrderContext(self.order).cancel_order()
+        event = OrderEvent.objects.get(order=self.order, event_type='canceled_with_stock_return')
+        self.assertTrue(deliver_event(claim_batch(10)[0]))
+
+        # A worker that died before recording the delivery hands the event out again.
+        OrderEvent.objects.filter(pk=event.pk).update(status=OrderEvent.PENDING, delivered_to=[])
+        self.assertTrue(deliver_event(claim_batch(10)[0]))
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 7)
+        self.assertTrue(Order.objects.get(pk=self.order.pk).stock_returned)
+
+    def test_stats_flushed_by_the_worker_reach_the_endpoint(self):
+        notifier = get_order_notifier()
+        notifier.flush_stats()
+        ObserverStat.objects.all().delete()
+        OrderContext(self.order).cancel_order()
+        deliver_event(claim_batch(10)[0])
+        # What run_order_worker does after each batch; the web process has no counts of its own.
+        notifier.flush_stats()
+
+        self.client.force_login(get_user_model().objects.create_user('staff', password='secret', is_staff=True))
+        stats = self.client.get(reverse('orders:notifier_stats')).json()
+        self.assertEqual(stats['InventoryAdjustmentObserver']['calls'], 1)
+        self.assertEqual(stats['SalesRollupObserver']['calls'], 1)
+        self.assertEqual(stats['EmailNotificationObserver']['calls'], 0)
+
+
+class CheckoutPriceChangeTests(TestCase):
+    customer = {'first_name': 'Ann', 'last_name': 'Baker', 'email': 'ann@example.com',
+                'address': '1 Oven St', 'postal_code': '0000', 'city': 'Crumbs'}
+
+    def setUp(self):
+        self.product = Product.objects.create(category=Category.objects.create(name='Bread'), name='Loaf',
+                                              price=Decimal('2.50'), stock=10)
+        product_cache.invalidate_products([self.product.id])
+        self.client.post(reverse('cart:cart_add', args=[self.product.id]), {'quantity': 2})
+
+    def test_price_version_bump_reprices_the_cart_and_rejects_the_order(self):
+        # No save() signal: only the version bump tells the cart to look at the database again.
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal('3.00'))
+        bump_version(PRICE_VERSION)
+
+        response = self.client.post(reverse('orders:order_create'), self.customer)
+        self.assertFalse(Order.objects.exists())
+        self.assertIn('The price of Loaf changed from $2.50 to $3.00', response.context['form'].non_field_errors()[0])
+
+        # The re-priced cart was stored, so the customer can confirm at the new price.
+        self.client.post(reverse('orders:order_create'), self.customer)
+        self.assertEqual(OrderItem.objects.get().price, Decimal('3.00'))
+
+    def test_unchanged_price_version_places_the_order(self):
+        self.client.post(reverse('orders:order_create'), self.customer)
+        self.assertEqual(OrderItem.objects.get().price, Decimal('2.50'))
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.rng = random.Random(3)
+        self.categories = [Category.objects.create(name=f'Shelf {i}') for i in range(3)]
+        self.products = [Product.objects.create(category=self.categories[i % 3], name=f'Item {i}',
+                                                price=Decimal('1.99') + i, stock=10 ** 6) for i in range(5)]
+
+    def drain(self):
+        # What run_order_worker does, without its threads, which would not see the test transaction.
+        while True:
+            events = claim_batch(100)
+            if not events:
+                return
+            process_batch(events)
+
+    def place(self, n):
+        order = Order.objects.create(first_name='Cy', last_name='Dough', email='cy@example.com',
+                                     address='2 Rye Rd', postal_code='1111', city='Crumbs')
+        items = [OrderItem(order=order, product=product, category_id=product.category_id, price=product.price,
+                           quantity=self.rng.randint(1, 4))
+                 for product in self.rng.sample(self.products, self.rng.randint(1, 3))]
+        OrderItem.objects.bulk_create(items)
+        gross = sum(item.get_cost() for item in items)
+        Order.objects.filter(pk=order.pk).update(
+            final_total_price=(gross * Decimal('0.9')).quantize(Decimal('0.01')) if n % 3 == 0 else gross,
+            created_at=datetime(2026, 10, 1 + n % 4, n % 24, 30, tzinfo=dt_timezone.utc),
+        )
+        publish_order_event(order, 'created')
+
+    def move_products(self):
+        for product in self.rng.sample(self.products, 2):
+            Product.objects.filter(pk=product.pk).update(category=self.rng.choice(self.categories))
+            product.refresh_from_db()
+
+    def brute_force(self):
+        """The rollups recomputed from the orders that are not canceled, by category at order time."""
+        expected = {}
+        for order in Order.objects.exclude(status='CANCELED').prefetch_related('items'):
+            items = list(order.items.all())
+            day = order.created_at.date()
+            hour = order.created_at.replace(minute=0, second=0, microsecond=0)
+            for dimension, key_of in ((SalesRollup.TOTAL, lambda item: 0),
+                                      (SalesRollup.CATEGORY, lambda item: item.category_id),
+                                      (SalesRollup.PRODUCT, lambda item: item.product_id)):
+                # An order without items still counts as an order in the total.
+                keys = {0} if dimension == SalesRollup.TOTAL else {key_of(item) for item in items}
+                for key in keys:
+                    lines = [item for item in items if key_of(item) == key]
+                    for period in (day, hour):
+                        row = expected.setdefault((dimension, period, key), [0, 0, Decimal('0.00')])
+                        row[0] += 1
+                        row[1] += sum(item.quantity for item in lines)
+                        row[2] += sum(item.get_cost() for item in lines)
+        return expected
+
+    def rollups(self):
+        return {(row.dimension, getattr(row, period), row.key): [row.orders, row.units, row.gross]
+                for model, period in ((DailySales, 'day'), (HourlySales, 'hour'))
+                for row in model.objects.all() if row.orders or row.units}
+
+    def assert_rollups_match(self):
+        self.assertEqual(self.rollups(), self.brute_force())
+        net = sum(Order.objects.exclude(status='CANCELED').values_list('final_total_price', flat=True))
+        for model in (DailySales, HourlySales):
+            for dimension in (SalesRollup.TOTAL, SalesRollup.CATEGORY, SalesRollup.PRODUCT):
+                self.assertEqual(sum(model.objects.filter(dimension=dimension).values_list('net', flat=True)), net)
+
+    def test_create_cancel_and_backfill_match_a_brute_force_recount(self):
+        for n in range(40):
+            self.place(n)
+            if n % 10 == 9:
+                self.move_products()
+        self.drain()
+        self.assert_rollups_match()
+
+        # Products change category after the sale; canceling must take it back out where it was counted.
+        self.move_products()
+        for order in self.rng.sample(list(Order.objects.all()), 12):
+            OrderContext(order).cancel_order()
+        self.drain()
+        self.assert_rollups_match()
+
+        self.move_products()
+        call_command('backfill_sales_rollups', rebuild=True, chunk_size=7, stdout=StringIO())
+        self.assert_rollups_match()
+
+    def test_orders_without_items_count_in_the_total_only(self):
+        for n in range(6):
+            self.place(n)
+        empty = [Order.objects.create(first_name='Dee', last_name='Empty', email='dee@example.com',
+                                      address='3 Crust Ln', postal_code='2222', city='Crumbs') for _ in range(2)]
+        for order in empty:
+            publish_order_event(order, 'created')
+        self.drain()
+        self.assert_rollups_match()
+        day = timezone.localtime(empty[0].created_at).date()
+        self.assertEqual(DailySales.objects.get(dimension=SalesRollup.TOTAL, day=day).orders, 2)
+
+        OrderContext(empty[0]).cancel_order()
+        self.drain()
+        self.assert_rollups_match()
+        self.assertEqual(DailySales.objects.get(dimension=SalesRollup.TOTAL, day=day).orders, 1)
+
+        call_command('backfill_sales_rollups', rebuild=True, chunk_size=3, stdout=StringIO())
+        self.assert_rollups_match()
+
+    def test_checkout_records_the_category_at_order_time(self):
+        product = self.products[0]
+        self.client.post(reverse('cart:cart_add', args=[product.id]), {'quantity': 2})
+        self.client.post(reverse('orders:order_create'), {
+            'first_name': 'Ann', 'last_name': 'Baker', 'email': 'ann@example.com',
+            'address': '1 Oven St', 'postal_code': '0000', 'city': 'Crumbs',
+        })
+        self.assertEqual(OrderItem.objects.get().category_id, product.category_id)
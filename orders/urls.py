@@ -9,4 +9,8 @@ urlpatterns = [
 
     path('admin/order/<int:order_id>/', views.admin_order_detail_view, name='admin_order_detail'),
     path('admin/orders/', views.admin_order_list, name='admin_order_list'),
+    path('admin/orders/export/', views.admin_order_export, name='admin_order_export'),
+    path('admin/orders/bulk/', views.admin_order_bulk_transition, name='admin_order_bulk_transition'),
+    path('admin/notifier-stats/', views.notifier_stats, name='notifier_stats'),
+    path('admin/sales/', views.sales_report, name='sales_report'),
 ]
\ No newline at end of file
@@ -1,15 +1,25 @@
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
+from django.utils import timezone
+from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.http import require_POST
 
 from services.order_facade import OrderPlacementFacade
-from .models import Order
-from .forms import OrderCreateForm
-from cart.cart import Cart
+from catalog.models import Category, Product
+from .models import Order, OrderItem, SalesRollup
+from .forms import OrderCreateForm, OrderListFilterForm, SalesReportForm
+from cart.cart import get_cart
 
 from services.order_builder import OrderBuilder
 from services.notification_service import get_order_notifier
-from services.order_state_machine import OrderContext
+from services.order_state_machine import OrderContext, StaleOrderStateError, bulk_transition
+from services.order_export import FORMATS, stream_export
+from services.pagination import KeysetPaginator
+from services.sales_rollups import sales_by_period, sales_totals
 from services.discount_strategies import (
     DefaultOrderDiscountAllocator,
     PromoCodeDiscountAllocator,
@@ -18,7 +28,7 @@ from services.discount_strategies import (
 
 
 def order_create(request):
-    cart = Cart(request)
+    cart = get_cart(request)
     if not cart and request.method == 'GET':
         return redirect('catalog:product_list')
 
@@ -36,6 +46,7 @@ def order_create(request):
                     for error_msg in errors:
                         form.add_error(None, error_msg)
     else:
+        cart.refresh_prices()
         form = OrderCreateForm()
 
     context = {
@@ -64,12 +75,19 @@ def admin_order_detail_view(request, order_id):
 
     if request.method == 'POST':
         action = request.POST.get('action')
-        if action == 'process_next':
-            order_context.process_next_step()
-        elif action == 'cancel':
-            order_context.cancel_order()
+        try:
+            if action == 'process_next':
+                order_context.process_next_step()
+            elif action == 'cancel':
+                order_context.cancel_order()
+        except StaleOrderStateError:
+            messages.warning(request, f"Order #{order.id} was changed by someone else meanwhile; "
+                                      f"it is now {order.get_status_display()}. Nothing was done.")
         return redirect('orders:admin_order_detail', order_id=order.id)
 
+    prefetch_related_objects(
+        [order], Prefetch('items', queryset=OrderItem.objects.select_related('product')), 'transitions'
+    )
     context = {
         'order': order,
         'order_context': order_context
@@ -78,5 +96,86 @@ def admin_order_detail_view(request, order_id):
 
 @staff_member_required
 def admin_order_list(request):
-    orders = Order.objects.all().order_by('-created_at')
-    return render(request, 'orders/admin/order_list.html', {'orders': orders})
\ No newline at end of file
+    filter_form = OrderListFilterForm(request.GET or None)
+    orders = filter_form.filter(Order.objects.all())
+    filter_query = request.GET.copy()
+    filter_query.pop('cursor', None)
+
+    paginator = KeysetPaginator(orders, ordering=Order._meta.ordering,
+                                per_page=settings.ORDER_ADMIN_PAGE_SIZE, salt='orders.admin_order_list')
+    page = paginator.get_page(request.GET.get('cursor'))
+
+    context = {
+        'orders': page,
+        'page': page,
+        'filter_form': filter_form,
+        'filter_query': filter_query.urlencode(),
+    }
+    return render(request, 'orders/admin/order_list.html', context)
+
+
+@staff_member_required
+def admin_order_export(request):
+    """
+    The orders matching the order list filters, one row per item, streamed as
+    CSV or JSONL. Invalid filters or an unknown format are a 400 with the
+    errors, never a silently wider export. Throughput goes to the log only.
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        error = f"Unknown format {fmt!r}, expected one of: {', '.join(FORMATS)}."
+        return JsonResponse({'errors': {'format': [error]}}, status=400)
+    filter_form = OrderListFilterForm(request.GET or None)
+    if filter_form.is_bound and not filter_form.is_valid():
+        return JsonResponse({'errors': {field: list(errors) for field, errors in filter_form.errors.items()}},
+                            status=400)
+    orders = filter_form.filter(Order.objects.all())
+    response = StreamingHttpResponse(stream_export(orders, fmt, settings.ORDER_EXPORT_CHUNK_SIZE),
+                                     content_type=FORMATS[fmt])
+    filename = f"orders-{timezone.now():%Y%m%d-%H%M%S}.{fmt}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@staff_member_required
+@require_POST
+def admin_order_bulk_transition(request):
+    action = request.POST.get('action')
+    actions = {'process_next': 'process_next_step', 'cancel': 'cancel_order'}
+    order_ids = [int(order_id) for order_id in request.POST.getlist('order_ids') if order_id.isdigit()]
+    if action in actions and order_ids:
+        result = bulk_transition(order_ids, actions[action])
+        for status, ids in result.moved.items():
+            messages.success(request, f"{len(ids)} orders moved to {status}.")
+        if result.skipped:
+            messages.warning(request, "Skipped: " + ', '.join(
+                f"#{order_id} ({reason})" for order_id, reason in sorted(result.skipped.items())
+            ))
+    return redirect('orders:admin_order_list')
+
+
+@staff_member_required
+def notifier_stats(request):
+    """Per-observer invocation and error counts and latency histograms, as JSON."""
+    return JsonResponse(get_order_notifier().get_stats())
+
+
+@staff_member_required
+def sales_report(request):
+    """Orders, units and revenue per period, overall or per category or product, from the rollup tables."""
+    form = SalesReportForm(request.GET or None)
+    context = {'form': form}
+    if form.is_valid():
+        dimension, hourly = form.cleaned_data['dimension'], form.cleaned_data['hourly']
+        date_from, date_to = form.cleaned_data['date_from'], form.cleaned_data['date_to']
+        rows = sales_by_period(dimension, date_from, date_to, hourly=hourly)
+        totals = sales_totals(dimension, date_from, date_to) if dimension != SalesRollup.TOTAL else []
+
+        model = {SalesRollup.CATEGORY: Category, SalesRollup.PRODUCT: Product}.get(dimension)
+        names = dict(model.objects.filter(pk__in={row['key'] for row in rows})
+                     .values_list('pk', 'name')) if model else {}
+        for row in rows + totals:
+            row['period'] = row.get('hour' if hourly else 'day')
+            row['name'] = names.get(row['key'], f"#{row['key']}") if model else 'All orders'
+        context.update({'rows': rows, 'totals': totals, 'hourly': hourly})
+    return render(request, 'orders/admin/sales_report.html', context)
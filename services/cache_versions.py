@@ -0,0 +1,69 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Bumped whenever any product row changes; validates catalog pages and cached products.
+CATALOG_VERSION = 'catalog'
+# Bumped whenever a product price changes; carts priced under an older value get re-priced.
+PRICE_VERSION = 'prices'
+
+VERSION_KEY = 'version:{name}'
+
+
+# name -> (counter, time.monotonic() it was read); this process's view of the shared counters.
+_polled = {}
+
+
+def _shared():
+    # The counters live in their own alias, shared by every process even when 'default' is not.
+    return caches['versions']
+
+
+def _seed() -> int:
+    # Seeded from the clock so a counter lost to eviction never repeats an old value.
+    return int(time.time() * 1000)
+
+
+def get_versions(*names: str) -> dict:
+    """
+    Current counter for each name. Counters read less than
+    CACHE_VERSION_POLL_INTERVAL seconds ago are reused; the rest are fetched
+    with one get_many.
+    """
+    now = time.monotonic()
+    versions = {}
+    for name in names:
+        polled = _polled.get(name)
+        if polled is not None and now - polled[1] < settings.CACHE_VERSION_POLL_INTERVAL:
+            versions[name] = polled[0]
+    if len(versions) == len(names):
+        return versions
+
+    shared = _shared()
+    keys = {VERSION_KEY.format(name=name): name for name in names if name not in versions}
+    found = shared.get_many(keys.keys())
+    for key, name in keys.items():
+        if key not in found:
+            shared.add(key, _seed(), None)
+            found[key] = shared.get(key)
+        versions[name] = found[key]
+        _polled[name] = (found[key], now)
+    return versions
+
+
+def get_version(name: str) -> int:
+    return get_versions(name)[name]
+
+
+def bump_version(name: str) -> None:
+    """Move the counter on; this process sees the new value at once, others within the poll interval."""
+    shared = _shared()
+    key = VERSION_KEY.format(name=name)
+    try:
+        version = shared.incr(key)
+    except ValueError:
+        shared.add(key, _seed(), None)
+        version = shared.get(key)
+    _polled[name] = (version, time.monotonic())
+
@@ -0,0 +1,162 @@
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from decimal import Decimal
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from catalog.models import Category, Product, ProductFacetCount, CATEGORY_PATH_SEPARATOR
+from .cache_versions import get_version, CATALOG_VERSION
+from .category_tree import get_category_tree, flatten_category_tree
+
+FACET_SUMMARY_KEY = 'catalog:facets:v{version}'
+
+
+def price_bucket(price) -> int:
+    return max(bisect_right(settings.CATALOG_PRICE_BUCKETS, Decimal(price)) - 1, 0)
+
+
+def price_bucket_bounds(bucket: int) -> tuple:
+    bounds = settings.CATALOG_PRICE_BUCKETS
+    low = Decimal(bounds[bucket])
+    high = Decimal(bounds[bucket + 1]) if bucket + 1 < len(bounds) else None
+    return low, high
+
+
+def price_bucket_label(bucket: int) -> str:
+    low, high = price_bucket_bounds(bucket)
+    return f'${low} - ${high}' if high is not None else f'${low}+'
+
+
+def facet_key(category_id, price, stock, available) -> Optional[tuple]:
+    """The facet cell a product counts towards, or None if it is not listed."""
+    if not available or category_id is None or price is None:
+        return None
+    return category_id, price_bucket(price), stock > 0
+
+
+def loaded_facet_key(product: Product) -> Optional[tuple]:
+    if not hasattr(product, '_loaded_values'):
+        return None
+    return facet_key(*(product.get_loaded_value(name) for name in ('category_id', 'price', 'stock', 'available')))
+
+
+def current_facet_key(product: Product) -> Optional[tuple]:
+    return facet_key(product.category_id, product.price, product.stock, product.available)
+
+
+def _adjust(key: tuple, delta: int) -> None:
+    category_id, bucket, in_stock = key
+    cell = ProductFacetCount.objects.filter(category_id=category_id, price_bucket=bucket, in_stock=in_stock)
+    if delta < 0:
+        cell.filter(count__gte=-delta).update(count=F('count') + delta)
+    elif not cell.update(count=F('count') + delta):
+        try:
+            with transaction.atomic():
+                ProductFacetCount.objects.create(category_id=category_id, price_bucket=bucket,
+                                                 in_stock=in_stock, count=delta)
+        except IntegrityError:
+            cell.update(count=F('count') + delta)
+
+
+def apply_product_change(old_key: Optional[tuple], new_key: Optional[tuple]) -> None:
+    """Move one product between facet cells: two single-row UPDATEs at most."""
+    if old_key == new_key:
+        return
+    if old_key:
+        _adjust(old_key, -1)
+    if new_key:
+        _adjust(new_key, 1)
+
+
+def rebuild_facet_counts(category_ids=None) -> int:
+    """
+    Recount the facet cells from the product table, for all categories or only
+    the given ones. Used for bulk writes and as a repair tool.
+    """
+    products = Product.objects.filter(available=True)
+    cells = ProductFacetCount.objects.all()
+    if category_ids is not None:
+        category_ids = set(category_ids)
+        products = products.filter(category_id__in=category_ids)
+        cells = cells.filter(category_id__in=category_ids)
+
+    counts = Counter(
+        facet_key(category_id, price, stock, True)
+        for category_id, price, stock
+        in products.order_by().values_list('category_id', 'price', 'stock').iterator()
+    )
+    with transaction.atomic():
+        cells.delete()
+        ProductFacetCount.objects.bulk_create(
+            [ProductFacetCount(category_id=c, price_bucket=b, in_stock=s, count=n)
+             for (c, b, s), n in counts.items()],
+            batch_size=500
+        )
+    return len(counts)
+
+
+def get_facet_summary() -> list:
+    """All non-empty cells as (category_id, price_bucket, in_stock, count), cached per catalog version."""
+    key = FACET_SUMMARY_KEY.format(version=get_version(CATALOG_VERSION))
+    summary = cache.get(key)
+    if summary is None:
+        summary = list(ProductFacetCount.objects.filter(count__gt=0).values_list(
+            'category_id', 'price_bucket', 'in_stock', 'count'))
+        cache.set(key, summary, None)
+    return summary
+
+
+def compute_facets(current_category: Optional[Category], selected_bucket: Optional[int],
+                   in_stock_only: bool) -> dict:
+    """
+    Live counts for each facet, honouring the other active filters, summed in
+    memory over the small facet cube instead of grouping the product table.
+    """
+    nodes = {node['id']: node for node in flatten_category_tree(get_category_tree())}
+    base_path = current_category.path if current_category else ''
+    depth = len(base_path.split(CATEGORY_PATH_SEPARATOR)) - 1 if base_path else 0
+
+    category_counts = defaultdict(int)
+    price_counts = defaultdict(int)
+    in_stock_count = 0
+    for category_id, bucket, in_stock, count in get_facet_summary():
+        node = nodes.get(category_id)
+        if node is None or not node['path'].startswith(base_path):
+            continue
+        price_ok = selected_bucket is None or bucket == selected_bucket
+        stock_ok = in_stock or not in_stock_only
+        if stock_ok:
+            price_counts[bucket] += count
+        if price_ok and in_stock:
+            in_stock_count += count
+        if price_ok and stock_ok:
+            segments = node['path'].split(CATEGORY_PATH_SEPARATOR)
+            if len(segments) - 1 > depth:
+                category_counts[int(segments[depth])] += count
+
+    if current_category is None:
+        children = get_category_tree()
+    else:
+        children = nodes.get(current_category.id, {}).get('children', [])
+    return {
+        'categories': [{'node': child, 'count': category_counts.get(child['id'], 0)} for child in children],
+        'prices': [{'bucket': b, 'label': price_bucket_label(b), 'count': price_counts.get(b, 0),
+                    'selected': b == selected_bucket}
+                   for b in range(len(settings.CATALOG_PRICE_BUCKETS))],
+        'in_stock': {'count': in_stock_count, 'selected': in_stock_only},
+    }
+
+
+def filter_products(products, selected_bucket: Optional[int], in_stock_only: bool):
+    if selected_bucket is not None:
+        low, high = price_bucket_bounds(selected_bucket)
+        products = products.filter(price__gte=low)
+        if high is not None:
+            products = products.filter(price__lt=high)
+    if in_stock_only:
+        products = products.filter(stock__gt=0)
+    return products
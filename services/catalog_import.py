@@ -0,0 +1,196 @@
+import csv
+import json
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from catalog.models import Category, Product, allocate_unique_slug
+from catalog.signals import products_changed
+
+UPDATE_FIELDS = ['name', 'description', 'category', 'price', 'stock', 'available', 'updated_at']
+# Row attribute -> field name reported through products_changed.
+IMPORTED_FIELDS = {'name': 'name', 'description': 'description', 'category_id': 'category',
+                   'price': 'price', 'stock': 'stock', 'available': 'available'}
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+# Rows are checked against the model fields, so one bad value cannot fail a whole bulk_create batch.
+PRICE_FIELD = Product._meta.get_field('price')
+STOCK_FIELD = Product._meta.get_field('stock')
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+    errors: list = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def read_rows(path: str, file_format: Optional[str] = None) -> Iterator[dict]:
+    """Stream dict rows from a CSV or JSON Lines file without loading it into memory."""
+    file_format = file_format or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as fh:
+        if file_format == 'jsonl':
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(fh)
+
+
+class SlugAllocator:
+    """
+    Hands out unique product slugs against one preloaded slug set, remembering the
+    next free suffix per base so a run of identical names stays linear.
+    """
+
+    def __init__(self, taken: Iterable[str]):
+        self._taken = set(taken)
+        self._next_suffix = {}
+
+    def allocate(self, name: str, preferred: str = '') -> str:
+        if preferred and preferred not in self._taken:
+            self._taken.add(preferred)
+            return preferred
+        base_slug = slugify(name) or 'product'
+        slug = allocate_unique_slug(base_slug, self._taken, start=self._next_suffix.get(base_slug, 1))
+        self._taken.add(slug)
+        if slug != base_slug:
+            self._next_suffix[base_slug] = int(slug.rsplit('-', 1)[1]) + 1
+        return slug
+
+
+class CatalogImporter:
+    def __init__(self, key: str = 'sku', batch_size: int = 500, create_categories: bool = False):
+        if key not in ('sku', 'slug'):
+            raise ValueError("Import key must be 'sku' or 'slug'.")
+        self.key = key
+        self.batch_size = batch_size
+        self.create_categories = create_categories
+        self._categories = dict(Category.objects.values_list('slug', 'id'))
+        self._slugs = SlugAllocator(Product.objects.order_by().values_list('slug', flat=True).iterator())
+
+    def _category_id(self, value: str) -> int:
+        slug = slugify(value)
+        if slug not in self._categories:
+            if not self.create_categories:
+                raise ImportRowError(f"Unknown category '{value}'.")
+            self._categories[slug] = Category.objects.create(name=value.strip(), slug=slug).id
+        return self._categories[slug]
+
+    def _parse(self, row: dict) -> dict:
+        name = (row.get('name') or '').strip()
+        if not name:
+            raise ImportRowError("Missing product name.")
+        try:
+            price = PRICE_FIELD.clean(str(row.get('price', '')).strip(), None)
+            if price < 0:
+                raise ValidationError("Ensure this value is greater than or equal to 0.")
+        except ValidationError as e:
+            raise ImportRowError(f"Invalid price for '{name}': {' '.join(e.messages)}")
+        stock = row.get('stock')
+        if stock in (None, ''):
+            stock = 0
+        # JSON numbers arrive typed; a float or boolean stock is an error, not something to truncate.
+        if isinstance(stock, bool) or not isinstance(stock, (int, str)):
+            raise ImportRowError(f"Invalid stock for '{name}': {stock!r} is not a whole number.")
+        try:
+            stock = STOCK_FIELD.clean(stock, None)
+            if stock < 0:
+                raise ValidationError("Ensure this value is greater than or equal to 0.")
+        except ValidationError as e:
+            raise ImportRowError(f"Invalid stock for '{name}': {' '.join(e.messages)}")
+        available = row.get('available')
+        return {
+            'sku': (row.get('sku') or '').strip() or None,
+            'slug': (row.get('slug') or '').strip(),
+            'name': name,
+            'description': row.get('description') or '',
+            'category_id': self._category_id(row.get('category') or ''),
+            'price': price,
+            'stock': stock,
+            'available': True if available in (None, '') else str(available).strip().lower() in TRUE_VALUES,
+        }
+
+    def _write_batch(self, rows: list, report: ImportReport) -> dict:
+        by_key = {}
+        for row in rows:
+            by_key[row[self.key] or id(row)] = row
+
+        keys = [row[self.key] for row in by_key.values() if row[self.key]]
+        existing = {getattr(p, self.key): p for p in Product.objects.filter(**{f'{self.key}__in': keys})}
+
+        now = timezone.now()
+        to_create, to_update = [], []
+        fields, left_categories = set(), set()
+        for row in by_key.values():
+            product = existing.get(row[self.key]) if row[self.key] else None
+            if product is None:
+                product = Product(**row)
+                product.slug = self._slugs.allocate(row['name'], preferred=row['slug'])
+                to_create.append(product)
+            else:
+                for attr, field_name in IMPORTED_FIELDS.items():
+                    if getattr(product, attr) != row[attr]:
+                        fields.add(field_name)
+                        if attr == 'category_id':
+                            left_categories.add(product.category_id)
+                    setattr(product, attr, row[attr])
+                product.updated_at = now
+                to_update.append(product)
+        if to_create:
+            # No cart can hold a new product yet, so its price is not a price
+            # change; the recount of its category covers the price facets.
+            fields |= set(IMPORTED_FIELDS.values()) - {'price'}
+
+        with transaction.atomic():
+            Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+            Product.objects.bulk_update(to_update, UPDATE_FIELDS, batch_size=self.batch_size)
+
+        report.created += len(to_create)
+        report.updated += len(to_update)
+        return {
+            'product_ids': [p.pk for p in to_create + to_update],
+            'fields': sorted(fields),
+            'category_ids': left_categories,
+        }
+
+    def run(self, rows: Iterable[dict]) -> ImportReport:
+        report = ImportReport()
+        started = time.perf_counter()
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.batch_size))
+            if not chunk:
+                break
+            parsed = []
+            for line_no, raw in enumerate(chunk, start=report.rows + 1):
+                try:
+                    parsed.append(self._parse(raw))
+                except ImportRowError as e:
+                    report.skipped += 1
+                    report.errors.append(f"Row {line_no}: {e}")
+            report.rows += len(chunk)
+            if parsed:
+                changes = self._write_batch(parsed, report)
+                if changes['fields']:
+                    products_changed.send(sender=Product, **changes)
+            report.batches += 1
+        report.elapsed = time.perf_counter() - started
+        return report
@@ -0,0 +1,64 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from catalog.models import Category
+from .cache_versions import get_version, bump_version
+
+CATEGORY_TREE_VERSION = 'category_tree'
+CATEGORY_TREE_KEY = 'catalog:category_tree:v{version}'
+
+
+def get_category_tree_version() -> int:
+    return get_version(CATEGORY_TREE_VERSION)
+
+
+def bump_category_tree_version() -> None:
+    bump_version(CATEGORY_TREE_VERSION)
+
+
+def _build_category_tree() -> list:
+    rows = Category.objects.values('id', 'name', 'slug', 'parent_id', 'path', 'depth')
+    children = defaultdict(list)
+    for row in rows:
+        node = {
+            'id': row['id'],
+            'name': row['name'],
+            'slug': row['slug'],
+            'path': row['path'],
+            'depth': row['depth'],
+            'url': Category(slug=row['slug']).get_absolute_url(),
+            'children': [],
+        }
+        children[row['parent_id']].append(node)
+
+    for nodes in children.values():
+        nodes.sort(key=lambda n: n['name'])
+    for nodes in list(children.values()):
+        for node in nodes:
+            node['children'] = children.get(node['id'], [])
+    return children[None]
+
+
+def get_category_tree() -> list:
+    """
+    Root categories as nested dicts, built with one query and cached until the
+    next Category save/delete bumps the version.
+    """
+    key = CATEGORY_TREE_KEY.format(version=get_category_tree_version())
+    tree = cache.get(key)
+    if tree is None:
+        tree = _build_category_tree()
+        cache.set(key, tree, None)
+    return tree
+
+
+def flatten_category_tree(tree: list) -> list:
+    """Depth-first list of nodes, the order the sidebar renders them in."""
+    flat = []
+    stack = list(reversed(tree))
+    while stack:
+        node = stack.pop()
+        flat.append(node)
+        stack.extend(reversed(node['children']))
+    return flat
@@ -1,8 +1,24 @@
 from abc import ABC, abstractmethod
+from typing import Optional
+from django.db import transaction
 from django.http import HttpRequest
-from cart.cart import Cart
 from catalog.models import Product
-from django.shortcuts import get_object_or_404
+from cart.cart import get_cart
+from cart.forms import PRODUCT_QUANTITY_CHOICES
+from .inventory import InsufficientStockError, release_stock, reserve_stock
+from .product_cache import get_product_or_404, get_products
+
+MAX_BATCH_OPERATIONS = 100
+MAX_QUANTITY = PRODUCT_QUANTITY_CHOICES[-1][0]
+# Largest BigAutoField value; anything above cannot be a product id and overflows the database.
+MAX_PRODUCT_ID = 2 ** 63 - 1
+
+
+def _strict_int(value) -> int:
+    """An int or integer string; booleans and floats are rejected rather than coerced."""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise TypeError(value)
+    return int(value)
 
 
 class Command(ABC):
@@ -11,25 +27,41 @@ class Command(ABC):
         pass
 
 class AddToCartCommand(Command):
-    def __init__(self, request: HttpRequest, product_id: int, quantity: int, update_quantity: bool = False):
+    def __init__(self, request: HttpRequest, product_id: int, quantity: int, update_quantity: bool = False,
+                 product: Optional[Product] = None):
         self.request = request
         self.product_id = product_id
         self.quantity = quantity
         self.update_quantity = update_quantity
         self._cart = None
-        self._product = None
+        self._product = product
+        self.error = None
 
     def _initialize(self):
         if not self._cart:
-            self._cart = Cart(self.request)
+            self._cart = get_cart(self.request)
         if not self._product:
-            self._product = get_object_or_404(Product, id=self.product_id)
+            self._product = get_product_or_404(self.product_id)
 
     def execute(self):
         self._initialize()
         if self.quantity <= 0:
             print(f"Command Error: Quantity for product {self.product_id} must be positive.")
             return False
+        if not self._product.available:
+            self.error = f"{self._product.name} is not available."
+            print(f"Command Error: {self.error}")
+            return False
+
+        # The cart line and its stock reservation always hold the same quantity.
+        item = self._cart.get_item(self._product.id)
+        target = self.quantity if self.update_quantity or item is None else item.quantity + self.quantity
+        try:
+            reserve_stock(self._cart.token, self._product, target)
+        except InsufficientStockError as e:
+            self.error = str(e)
+            print(f"Command Error: {self.error}")
+            return False
 
         self._cart.add(
             product=self._product,
@@ -38,3 +70,103 @@ class AddToCartCommand(Command):
         )
         print(f"AddToCartCommand: Product {self._product.name} (Qty: {self.quantity}) added/updated in cart.")
         return True
+
+
+class RemoveFromCartCommand(Command):
+    def __init__(self, request: HttpRequest, product_id: int, product: Optional[Product] = None):
+        self.request = request
+        self.product_id = product_id
+        self._product = product
+
+    def execute(self):
+        if not self._product:
+            self._product = get_product_or_404(self.product_id)
+        cart = get_cart(self.request)
+        if cart.get_item(self._product.id) is not None:
+            release_stock(cart.token, [self._product.id])
+        cart.remove(self._product)
+        print(f"RemoveFromCartCommand: Product {self._product.name} removed from cart.")
+        return True
+
+
+class BatchCartCommand(Command):
+    """
+    Applies a list of operations such as
+    ``{"op": "add" | "update" | "remove", "product_id": 12, "quantity": 2}``
+    all-or-nothing. Everything is validated before the cart is touched, product
+    ids are resolved with one lookup and the cart is persisted once. A line
+    that cannot be reserved rolls back the whole batch, reservations included.
+    """
+    OPERATIONS = ('add', 'update', 'remove')
+
+    def __init__(self, request: HttpRequest, operations):
+        self.request = request
+        self.operations = operations
+        self.errors = []
+
+    def _validate(self):
+        if not isinstance(self.operations, list) or not self.operations:
+            return None, ["'operations' must be a non-empty list."]
+        if len(self.operations) > MAX_BATCH_OPERATIONS:
+            return None, [f"At most {MAX_BATCH_OPERATIONS} operations are allowed per request."]
+
+        parsed, errors = [], []
+        for index, operation in enumerate(self.operations):
+            if not isinstance(operation, dict):
+                errors.append(f"Operation {index}: must be an object.")
+                continue
+            op = operation.get('op')
+            if op not in self.OPERATIONS:
+                errors.append(f"Operation {index}: 'op' must be one of {', '.join(self.OPERATIONS)}.")
+                continue
+            try:
+                product_id = _strict_int(operation.get('product_id'))
+                quantity = _strict_int(operation.get('quantity', 1)) if op != 'remove' else 0
+            except (TypeError, ValueError):
+                errors.append(f"Operation {index}: 'product_id' and 'quantity' must be integers.")
+                continue
+            if not 1 <= product_id <= MAX_PRODUCT_ID:
+                errors.append(f"Operation {index}: unknown product id {product_id}.")
+                continue
+            if op != 'remove' and not 1 <= quantity <= MAX_QUANTITY:
+                errors.append(f"Operation {index}: 'quantity' must be between 1 and {MAX_QUANTITY}.")
+                continue
+            parsed.append((op, product_id, quantity))
+
+        if errors:
+            return None, errors
+
+        products = get_products(product_id for _, product_id, _ in parsed)
+        missing = sorted({product_id for _, product_id, _ in parsed} - products.keys())
+        if missing:
+            return None, [f"Unknown product ids: {', '.join(map(str, missing))}."]
+        # Lines of products taken off sale may still be removed, but not added or changed.
+        unavailable = sorted({product_id for op, product_id, _ in parsed
+                              if op != 'remove' and not products[product_id].available})
+        if unavailable:
+            return None, [f"Products not available: {', '.join(map(str, unavailable))}."]
+        return [(op, products[product_id], quantity) for op, product_id, quantity in parsed], []
+
+    def execute(self):
+        commands, self.errors = self._validate()
+        if self.errors:
+            print(f"BatchCartCommand: rejected ({len(self.errors)} errors).")
+            return False
+
+        cart = get_cart(self.request)
+        try:
+            with transaction.atomic(), cart.batch():
+                for op, product, quantity in commands:
+                    if op == 'remove':
+                        command = RemoveFromCartCommand(self.request, product.id, product=product)
+                    else:
+                        command = AddToCartCommand(self.request, product.id, quantity,
+                                                   update_quantity=(op == 'update'), product=product)
+                    if not command.execute():
+                        raise InsufficientStockError(command.error)
+        except InsufficientStockError as e:
+            self.errors = [str(e)]
+            print(f"BatchCartCommand: rolled back: {e}")
+            return False
+        print(f"BatchCartCommand: {len(commands)} operations applied.")
+        return True
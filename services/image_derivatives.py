@@ -0,0 +1,135 @@
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.utils import timezone
+
+from catalog.models import Product
+
+logger = logging.getLogger(__name__)
+
+# format key -> (Pillow format, file extension, MIME type, encoder options)
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', 'webp', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+
+
+def derivative_name(image_name: str, width: int, fmt: str) -> str:
+    """products/2025/05/29/bread.jpg -> products/2025/05/29/bread__w320.webp"""
+    root, _ = os.path.splitext(image_name)
+    return f'{root}__w{width}.{DERIVATIVE_FORMATS[fmt][1]}'
+
+
+def render_derivatives(source_path: str, targets: dict) -> list:
+    """
+    Resize and re-encode one image. Runs inside a pool worker, so it only touches
+    Pillow and the filesystem. ``targets`` maps width -> {format: absolute path}.
+    Returns the widths that were written. Widths above the original are
+    skipped, since a copy saved under them would be narrower than its srcset
+    entry claims; an image narrower than every width gets no derivatives and
+    is served as uploaded.
+    """
+    from PIL import Image, ImageOps
+
+    written = []
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        for width in sorted(targets):
+            if width > image.width:
+                break
+            resized = image.copy()
+            resized.thumbnail((width, width * 10), Image.LANCZOS)
+            for fmt, path in targets[width].items():
+                pil_format, _, _, options = DERIVATIVE_FORMATS[fmt]
+                frame = resized
+                if pil_format == 'JPEG' and frame.mode not in ('RGB', 'L'):
+                    frame = frame.convert('RGBA')
+                    background = Image.new('RGB', frame.size, (255, 255, 255))
+                    background.paste(frame, mask=frame.getchannel('A'))
+                    frame = background
+                frame.save(path, pil_format, **options)
+            written.append(width)
+    return written
+
+
+def _targets(image_name: str) -> dict:
+    return {
+        width: {fmt: default_storage.path(derivative_name(image_name, width, fmt)) for fmt in DERIVATIVE_FORMATS}
+        for width in settings.IMAGE_DERIVATIVE_WIDTHS
+    }
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_DERIVATIVE_WORKERS)
+    return _executor
+
+
+def store_variants(product_id: int, image_name: str, widths: list) -> bool:
+    """Record the generated widths, unless the product's image was replaced meanwhile."""
+    from catalog.signals import products_changed
+
+    updated = Product.objects.filter(pk=product_id, image=image_name).update(
+        image_variants=widths, updated_at=timezone.now()
+    )
+    if updated:
+        products_changed.send(sender=Product, product_ids=[product_id], fields=['image_variants'])
+    return bool(updated)
+
+
+def _on_rendered(product_id: int, image_name: str, submitted_from: int, future):
+    try:
+        store_variants(product_id, image_name, future.result())
+    except Exception:
+        logger.exception("Image derivatives failed for product %s (%s).", product_id, image_name)
+    finally:
+        # Normally this runs on the executor's own thread; close the connection it opened.
+        if threading.get_ident() != submitted_from:
+            connection.close()
+
+
+def schedule_derivatives(product: Product) -> None:
+    """Queue derivative generation for the product's current image in the process pool."""
+    if not product.image:
+        return
+    image_name = product.image.name
+    future = get_executor().submit(render_derivatives, default_storage.path(image_name), _targets(image_name))
+    future.add_done_callback(partial(_on_rendered, product.pk, image_name, threading.get_ident()))
+
+
+def generate_for_products(products, workers: int = None):
+    """
+    Synchronously (re)generate derivatives for many products. Yields
+    (product, widths or exception) as results come in.
+    """
+    products = [p for p in products if p.image]
+    with ProcessPoolExecutor(max_workers=workers or settings.IMAGE_DERIVATIVE_WORKERS) as pool:
+        futures = [
+            (product, pool.submit(render_derivatives, default_storage.path(product.image.name),
+                                  _targets(product.image.name)))
+            for product in products
+        ]
+        for product, future in futures:
+            try:
+                widths = future.result()
+            except Exception as e:
+                yield product, e
+                continue
+            store_variants(product.pk, product.image.name, widths)
+            yield product, widths
+
+
+def get_srcset(product: Product, fmt: str) -> str:
+    return ', '.join(
+        f'{default_storage.url(derivative_name(product.image.name, width, fmt))} {width}w'
+        for width in product.image_variants
+    )
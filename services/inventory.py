@@ -0,0 +1,193 @@
+from datetime import timedelta
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from cart.models import StockReservation
+from catalog.models import Product
+from catalog.signals import products_changed
+from orders.models import Order
+
+
+class InsufficientStockError(ValueError):
+    pass
+
+
+class _Shortfall(Exception):
+    """Rolls back a stock update that did not cover every line."""
+
+
+def _active_reservations(product_ids: Optional[Iterable[int]] = None, exclude_token: Optional[str] = None):
+    reservations = StockReservation.objects.filter(expires_at__gt=timezone.now())
+    if product_ids is not None:
+        reservations = reservations.filter(product_id__in=product_ids)
+    if exclude_token:
+        reservations = reservations.exclude(cart_token=exclude_token)
+    return reservations
+
+
+def reserved_quantities(product_ids: Iterable[int], exclude_token: Optional[str] = None) -> dict:
+    """Unexpired reserved quantity per product id, optionally ignoring one cart's own holds."""
+    return dict(
+        _active_reservations(product_ids, exclude_token)
+        .values('product_id').annotate(total=Sum('quantity'))
+        .values_list('product_id', 'total')
+    )
+
+
+def available_to_sell(product_ids: Iterable[int], exclude_token: Optional[str] = None) -> dict:
+    """``stock`` minus active reservations per product id, never below zero."""
+    product_ids = list(product_ids)
+    reserved = reserved_quantities(product_ids, exclude_token)
+    stock = dict(Product.objects.filter(id__in=product_ids).values_list('id', 'stock'))
+    return {pk: max(units - reserved.get(pk, 0), 0) for pk, units in stock.items()}
+
+
+@transaction.atomic
+def reserve_stock(cart_token: str, product: Product, quantity: int) -> StockReservation:
+    """
+    Hold ``quantity`` units of ``product`` for the cart (replacing what it held
+    before) for CART_RESERVATION_TTL seconds. The product row is locked while
+    the other carts' holds are summed, so parallel buyers cannot both take the
+    last units. Raises InsufficientStockError when not enough is available.
+    """
+    stock = Product.objects.select_for_update().values_list('stock', flat=True).get(pk=product.pk)
+    available = stock - reserved_quantities([product.pk], exclude_token=cart_token).get(product.pk, 0)
+    if available < quantity:
+        raise InsufficientStockError(
+            f"Only {max(available, 0)} of {product.name} available, {quantity} requested."
+        )
+
+    reservation, _ = StockReservation.objects.update_or_create(
+        cart_token=cart_token, product_id=product.pk,
+        defaults={
+            'quantity': quantity,
+            'expires_at': timezone.now() + timedelta(seconds=settings.CART_RESERVATION_TTL),
+        },
+    )
+    return reservation
+
+
+def release_stock(cart_token: str, product_ids: Optional[Iterable[int]] = None) -> int:
+    """Drop the cart's holds, on all products unless ``product_ids`` is given."""
+    reservations = StockReservation.objects.filter(cart_token=cart_token)
+    if product_ids is not None:
+        reservations = reservations.filter(product_id__in=product_ids)
+    return reservations.delete()[0]
+
+
+def _per_product(quantities: dict) -> Case:
+    return Case(*[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+                output_field=IntegerField())
+
+
+def _changed(product_ids) -> None:
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: products_changed.send(
+        sender=Product, product_ids=product_ids, fields=['stock', 'available']
+    ))
+
+
+def decrement_stock(quantities: dict, exclude_token: Optional[str] = None) -> None:
+    """
+    Take ``{product_id: quantity}`` off the shelf with a single
+    ``UPDATE ... SET stock = stock - q WHERE id IN (...) AND stock >= q + held``,
+    where ``held`` is what other carts (all but ``exclude_token``) still have
+    reserved. No row is read or locked beforehand. If any line falls short,
+    the update is rolled back to a savepoint, so no line is decremented, and
+    InsufficientStockError names every short line.
+    """
+    wanted = _per_product(quantities)
+    held = _active_reservations(exclude_token=exclude_token).filter(product_id=OuterRef('pk'))
+    held = held.order_by().values('product_id').annotate(total=Sum('quantity')).values('total')
+    try:
+        with transaction.atomic():
+            updated = Product.objects.filter(
+                pk__in=quantities, stock__gte=wanted + Coalesce(Subquery(held), Value(0)),
+            ).update(
+                stock=F('stock') - wanted,
+                available=Case(When(stock__lte=wanted, then=Value(False)), default=F('available')),
+                updated_at=timezone.now(),
+            )
+            if updated != len(quantities):
+                raise _Shortfall
+    except _Shortfall:
+        pass
+    else:
+        _changed(quantities)
+        return
+
+    # Read after the rollback, so the lines that did fit are not reported short.
+    available = available_to_sell(quantities, exclude_token=exclude_token)
+    names = dict(Product.objects.filter(pk__in=quantities).values_list('id', 'name'))
+    raise InsufficientStockError(' '.join(
+        f"Only {available.get(pk, 0)} of {names.get(pk, f'product {pk}')} left in stock, {quantity} requested."
+        for pk, quantity in quantities.items()
+        if available.get(pk, 0) < quantity
+    ) or "Stock changed while the order was placed. Please try again.")
+
+
+def convert_reservations(cart_token: str, quantities: dict) -> None:
+    """
+    Turn the cart's holds into stock decrements for ``{product_id: quantity}``
+    inside the order transaction. Lines whose hold expired still succeed if
+    the stock is not held by other carts.
+    """
+    decrement_stock(quantities, exclude_token=cart_token)
+    release_stock(cart_token)
+
+
+@transaction.atomic
+def restock(quantities: dict) -> None:
+    """
+    Put ``{product_id: quantity}`` back on the shelf with a single UPDATE.
+    Only products at zero stock, which decrement_stock hid when they sold
+    out, are made available again; products hidden by staff stay hidden.
+    """
+    wanted = _per_product(quantities)
+    Product.objects.filter(pk__in=quantities).update(
+        stock=F('stock') + wanted,
+        available=Case(When(stock=0, then=Value(True)), default=F('available')),
+        updated_at=timezone.now(),
+    )
+    _changed(quantities)
+
+
+def order_quantities(order) -> dict:
+    """``{product_id: quantity}`` over the order's items."""
+    return dict(
+        order.items.order_by().values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total')
+    )
+
+
+@transaction.atomic
+def return_order_stock(order) -> Optional[dict]:
+    """
+    Restock the items of a canceled ``order`` once. The ``stock_returned``
+    flag is flipped in the same transaction as the restock, so outbox
+    retries and redelivered events cannot return the stock twice. Returns
+    the quantities put back, or None if they already were.
+    """
+    if not Order.objects.filter(pk=order.pk, stock_returned=False).update(stock_returned=True):
+        return None
+    order.stock_returned = True
+    quantities = order_quantities(order)
+    restock(quantities)
+    return quantities
+
+
+def sweep_expired_reservations(batch_size: int = 1000) -> int:
+    """Delete expired holds in batches of ``batch_size`` rows. Returns the number deleted."""
+    deleted = 0
+    now = timezone.now()
+    while True:
+        batch = list(
+            StockReservation.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size]
+        )
+        if not batch:
+            return deleted
+        deleted += StockReservation.objects.filter(id__in=batch).delete()[0]
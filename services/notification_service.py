@@ -1,50 +1,102 @@
+import logging
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import List
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
 
-from orders.models import Order # Для type hinting
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from orders.models import ObserverStat, Order # Для type hinting
+from .inventory import return_order_stock
+from .sales_rollups import sync_order_sales
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the observer latency histogram buckets; the last bucket is open-ended.
+LATENCY_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+STATS_FIELDS = ('calls', 'errors', 'total_us') + tuple(f'le_{bound}' for bound in LATENCY_BUCKETS_MS) + ('le_inf',)
 
 
 class OrderObserver(ABC):
+    # Event types this observer is called for; None subscribes to every event.
+    event_types: Optional[Tuple[str, ...]] = None
+
     @abstractmethod
-    def update(self, order: Order, event_type: str):
+    def update(self, order: Order, event_type: str, **kwargs):
         pass
 
 
 class EmailNotificationObserver(OrderObserver):
-    def update(self, order: Order, event_type: str):
+    event_types = ('created', 'status_changed')
+
+    def update(self, order: Order, event_type: str, **kwargs):
         if event_type == 'created':
             print(f"SIMULATING: Sending email to {order.email} for new order {order.id}.")
         elif event_type == 'status_changed':
-            print(f"SIMULATING: Sending email to {order.email} for order {order.id} status update: {order.status}.")
+            status = kwargs.get('status', order.status)
+            print(f"SIMULATING: Sending email to {order.email} for order {order.id} status update: {status}.")
 
 class AdminNotificationObserver(OrderObserver):
-    def update(self, order: Order, event_type: str):
-        if event_type == 'created':
-            print(f"SIMULATING: Notifying admin about new order {order.id}.")
+    event_types = ('created',)
+
+    def update(self, order: Order, event_type: str, **kwargs):
+        print(f"SIMULATING: Notifying admin about new order {order.id}.")
 
 
 class InventoryAdjustmentObserver(OrderObserver):
-    """Уменьшает количество товара на складе при создании заказа."""
+    """Возвращает товар на склад при отмене заказа.
+
+    Stock for new orders is taken inside the order transaction by
+    services.inventory.convert_reservations, not here.
+    """
+    event_types = ('canceled_with_stock_return',)
+
     def update(self, order: Order, event_type: str, **kwargs):
-        if event_type == 'created':
-            print(f"InventoryAdjustment: Adjusting stock for order {order.id}.")
-            for item in order.items.all():
-                product = item.product
-                if product.stock >= item.quantity:
-                    product.stock -= item.quantity
-                    product.available = product.stock > 0
-                    product.save(update_fields=['stock', 'available'])
-                    print(f"  - Product {product.name}: stock reduced by {item.quantity}, new stock {product.stock}")
-                else:
-                    print(f"  - CRITICAL STOCK ERROR: Product {product.name} (ID: {product.id}) - requested {item.quantity}, available {product.stock}")
-        elif event_type == 'canceled_with_stock_return':
-            print(f"InventoryAdjustment: Returning stock for canceled order {order.id}.")
-            for item in order.items.all():
-                product = item.product
-                product.stock += item.quantity
-                product.available = True
-                product.save(update_fields=['stock']) # , 'available'
-                print(f"  - Product {product.name}: stock increased by {item.quantity}, new stock {product.stock}")
+        quantities = return_order_stock(order)
+        if quantities is None:
+            print(f"InventoryAdjustment: Stock for canceled order {order.id} was already returned.")
+            return
+        print(f"InventoryAdjustment: Returned stock for canceled order {order.id}: "
+              f"{sum(quantities.values())} units over {len(quantities)} products.")
+
+
+class SalesRollupObserver(OrderObserver):
+    """Counts new orders in the sales rollups and takes canceled ones back out."""
+    event_types = ('created', 'status_changed', 'canceled_with_stock_return')
+
+    def update(self, order: Order, event_type: str, **kwargs):
+        # Other status changes do not affect what is counted.
+        if event_type == 'created' or kwargs.get('status') == 'CANCELED':
+            added, removed = sync_order_sales([order.id])
+            print(f"SalesRollup: order {order.id} {event_type}: {added} counted, {removed} taken out.")
+
+
+class ObserverStats:
+    """Invocation count, error count and latency histogram of one observer."""
+    def __init__(self):
+        self.counts = dict.fromkeys(STATS_FIELDS, 0)
+
+    def record(self, elapsed: float, failed: bool):
+        self.counts['calls'] += 1
+        self.counts['errors'] += failed
+        self.counts['total_us'] += int(elapsed * 1_000_000)
+        bucket = bisect_left(LATENCY_BUCKETS_MS, elapsed * 1000)
+        self.counts[STATS_FIELDS[3 + bucket]] += 1
+
+
+def _stats_report(counts: Dict[str, int]) -> dict:
+    calls = counts['calls']
+    return {
+        'calls': calls,
+        'errors': counts['errors'],
+        'avg_ms': round(counts['total_us'] / calls / 1000, 3) if calls else None,
+        'latency_ms': {
+            **{f'<={bound}': counts[f'le_{bound}'] for bound in LATENCY_BUCKETS_MS},
+            f'>{LATENCY_BUCKETS_MS[-1]}': counts['le_inf'],
+        },
+    }
 
 
 class OrderNotifier:
@@ -60,6 +112,10 @@ class OrderNotifier:
         if self._initialized:
             return
         self._observers: List[OrderObserver] = []
+        self._routes: Dict[str, List[OrderObserver]] = {}
+        self._catch_all: List[OrderObserver] = []
+        self._stats: Dict[str, ObserverStats] = {}
+        self._stats_lock = threading.Lock()
         self._initialized = True
         print("OrderNotifier initialized.")
 
@@ -68,22 +124,98 @@ class OrderNotifier:
             raise TypeError("Attached observer must be an instance of OrderObserver.")
         if observer not in self._observers:
             self._observers.append(observer)
+            self._build_routes()
             print(f"Observer {observer.__class__.__name__} attached.")
 
     def detach(self, observer: OrderObserver):
         try:
             self._observers.remove(observer)
+            self._build_routes()
             print(f"Observer {observer.__class__.__name__} detached.")
         except ValueError:
             pass
 
+    def _build_routes(self):
+        # event type -> observers, in attach order; types nobody declared get only the catch-all observers.
+        self._catch_all = [observer for observer in self._observers if observer.event_types is None]
+        event_types = {event_type for observer in self._observers for event_type in observer.event_types or ()}
+        self._routes = {
+            event_type: [observer for observer in self._observers
+                         if observer.event_types is None or event_type in observer.event_types]
+            for event_type in event_types
+        }
+
+    def observers_for(self, event_type: str) -> List[OrderObserver]:
+        return self._routes.get(event_type, self._catch_all)
+
     def notify(self, order: Order, event_type: str, *args, **kwargs):
         print(f"OrderNotifier: Notifying observers about order {order.id}, event: {event_type}")
-        for observer in self._observers:
+        self.deliver(order, event_type, **kwargs)
+
+    def deliver(self, order: Order, event_type: str, skip=(), **kwargs):
+        """
+        Call every observer subscribed to ``event_type`` whose class name is
+        not in ``skip``. Returns the names that succeeded and
+        ``{name: exception}`` for those that raised.
+        """
+        delivered, errors = [], {}
+        for observer in self.observers_for(event_type):
+            name = observer.__class__.__name__
+            if name in skip:
+                continue
+            started = time.perf_counter()
             try:
                 observer.update(order, event_type, **kwargs)
+                delivered.append(name)
             except Exception as e:
-                print(f"Error in observer {observer.__class__.__name__}: {e}")
+                logger.exception("Observer %s failed on %s for order %s", name, event_type, order.id)
+                errors[name] = e
+            self._record(name, time.perf_counter() - started, name in errors)
+        return delivered, errors
+
+    def _record(self, name: str, elapsed: float, failed: bool):
+        with self._stats_lock:
+            self._stats.setdefault(name, ObserverStats()).record(elapsed, failed)
+
+    def flush_stats(self):
+        """
+        Add the counts gathered in this process to the ObserverStat table and
+        reset them, so get_stats() sees every web and worker process. Each
+        observer's counters are incremented in SQL by a single UPDATE, so
+        concurrent flushes do not lose counts.
+        """
+        with self._stats_lock:
+            stats, self._stats = self._stats, {}
+        with transaction.atomic():
+            for name, observer_stats in sorted(stats.items()):
+                counts = {field: value for field, value in observer_stats.counts.items() if value}
+                if not counts:
+                    continue
+                increments = {field: F(field) + value for field, value in counts.items()}
+                if ObserverStat.objects.filter(observer=name).update(**increments):
+                    continue
+                try:
+                    with transaction.atomic():
+                        ObserverStat.objects.create(observer=name, **counts)
+                except IntegrityError:
+                    # Another process created the row since the update above.
+                    ObserverStat.objects.filter(observer=name).update(**increments)
+
+    def get_stats(self) -> dict:
+        """Per-observer calls, errors, mean and histogram latency: flushed totals plus this process."""
+        with self._stats_lock:
+            local = {name: dict(observer_stats.counts) for name, observer_stats in self._stats.items()}
+        names = {observer.__class__.__name__ for observer in self._observers} | local.keys()
+        shared = {row['observer']: row for row in
+                  ObserverStat.objects.filter(observer__in=names).values('observer', *STATS_FIELDS)}
+        report = {}
+        for name in sorted(names):
+            counts = {
+                field: shared.get(name, {}).get(field, 0) + local.get(name, {}).get(field, 0)
+                for field in STATS_FIELDS
+            }
+            report[name] = _stats_report(counts)
+        return report
 
 
 def get_order_notifier() -> OrderNotifier:
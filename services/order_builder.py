@@ -5,6 +5,8 @@ from django.db import transaction
 from orders.models import Order, OrderItem
 from cart.cart import Cart
 from .discount_strategies import DiscountStrategy, NoDiscountStrategy
+from .inventory import convert_reservations
+from .order_outbox import publish_order_event
 
 
 class OrderBuilder:
@@ -28,9 +30,9 @@ class OrderBuilder:
         self._cart_instance = cart
         for item in cart:
             self._order_items_data.append({
-                'product': item['product_obj'],
-                'price': item['price'],
-                'quantity': item['quantity']
+                'product': item.product,
+                'price': item.price,
+                'quantity': item.quantity
             })
         return self
 
@@ -53,25 +55,37 @@ class OrderBuilder:
 
         return total_items_cost, discount_amount, final_total_price
 
-    @transaction.atomic
     def build(self) -> Order:
         if not self._order_data or not self._order_items_data:
             raise ValueError("Customer details and cart items must be set before building.")
 
+        # Everything that does not write is computed up front, so the
+        # transaction below holds its locks only for the writes themselves.
         total_items_cost, discount_amount, final_total_price = self._calculate_prices()
-
-        order = Order.objects.create(
+        order = Order(
             **self._order_data,
             final_total_price=final_total_price,
             applied_discount_info=self._discount_strategy.get_description()
         )
-
-        for item_data in self._order_items_data:
-            OrderItem.objects.create(
+        items = [
+            OrderItem(
                 order=order,
                 product=item_data['product'],
+                category_id=item_data['product'].category_id,
                 price=item_data['price'],
                 quantity=item_data['quantity']
             )
-
-        return order
\ No newline at end of file
+            for item_data in self._order_items_data
+        ]
+        quantities = {}
+        for item in items:
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+        with transaction.atomic():
+            order.save(force_insert=True)
+            OrderItem.objects.bulk_create(items)
+            # Raises InsufficientStockError (a ValueError), rolling the order back.
+            convert_reservations(self._cart_instance.token, quantities)
+            publish_order_event(order, 'created')
+
+        return order
@@ -2,7 +2,7 @@ from typing import Optional
 
 from django.http import HttpRequest
 from orders.models import Order
-from cart.cart import Cart
+from cart.cart import get_cart
 from .order_builder import OrderBuilder
 from .discount_strategies import (
     DiscountAllocator,
@@ -10,14 +10,12 @@ from .discount_strategies import (
     PromoCodeDiscountAllocator,
     NoDiscountStrategy
 )
-from .notification_service import get_order_notifier
-from decimal import Decimal
 
 
 class OrderPlacementFacade:
     def __init__(self, request: HttpRequest):
         self.request = request
-        self.cart = Cart(request)
+        self.cart = get_cart(request)
 
     def place_order(self, form_data: dict) -> tuple[Optional[Order], Optional[list]]:
         """
@@ -26,8 +24,17 @@ class OrderPlacementFacade:
         order_object is None if placement failed.
         errors_list contains error messages if any.
         """
+        # The header badge trusts the stored summary; checkout re-derives it.
+        self.cart.verify()
         if not self.cart:
             return None, ["Your cart is empty."]
+        price_changes = self.cart.refresh_prices()
+        if price_changes:
+            return None, [
+                f"The price of {line.product.name} changed from ${old_price} to ${line.price}. "
+                f"Please review your order."
+                for line, old_price in price_changes
+            ]
 
         builder = OrderBuilder()
         builder.set_customer_details(
@@ -43,10 +50,10 @@ class OrderPlacementFacade:
         current_total = self.cart.get_total_price()
 
         cart_items_for_discount = [
-            {'product_id': item['product_obj'].id,
-             'name': item['product_obj'].name,
-             'price': item.get('price_decimal', Decimal(item['price'])),
-             'quantity': item['quantity']}
+            {'product_id': item.product_id,
+             'name': item.product.name,
+             'price': item.price,
+             'quantity': item.quantity}
             for item in self.cart
         ]
 
@@ -67,11 +74,9 @@ class OrderPlacementFacade:
             builder.set_discount_strategy(selected_discount_strategy)
 
         try:
+            # Also records the 'created' event for run_order_worker.
             order = builder.build()
 
-            notifier = get_order_notifier()
-            notifier.notify(order, 'created')
-
             self.cart.clear()
 
             return order, None
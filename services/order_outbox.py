@@ -0,0 +1,114 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from orders.models import Order, OrderEvent
+from .notification_service import get_order_notifier
+
+
+def publish_order_event(order: Order, event_type: str, previous_status: Optional[str] = None,
+                        **payload) -> OrderEvent:
+    """
+    Record ``event_type`` for ``order`` in the outbox. Call it inside the
+    transaction that changed the order so the event exists exactly when the
+    change does.
+    """
+    return OrderEvent.objects.create(
+        order=order,
+        event_type=event_type,
+        payload={'status': order.status, 'previous_status': previous_status, **payload},
+        available_at=timezone.now(),
+    )
+
+
+def publish_order_events(order_ids: Iterable[int], event_type: str, status: str,
+                         previous_status: Optional[str] = None, **payload) -> list:
+    """publish_order_event for many orders that made the same move, as one bulk insert."""
+    now = timezone.now()
+    return OrderEvent.objects.bulk_create([
+        OrderEvent(
+            order_id=order_id,
+            event_type=event_type,
+            payload={'status': status, 'previous_status': previous_status, **payload},
+            available_at=now,
+        )
+        for order_id in order_ids
+    ])
+
+
+def claim_batch(batch_size: int) -> list:
+    """
+    Take up to ``batch_size`` due events and hide them from other workers for
+    ORDER_OUTBOX_LEASE seconds. An event whose worker dies reappears once the
+    lease runs out. Only the oldest pending event of each order is eligible,
+    so observers see an order's events in the order they happened.
+    """
+    now = timezone.now()
+    earlier = OrderEvent.objects.filter(
+        order=OuterRef('order'), status=OrderEvent.PENDING, id__lt=OuterRef('id')
+    )
+    with transaction.atomic():
+        events = list(
+            OrderEvent.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(status=OrderEvent.PENDING, available_at__lte=now)
+            .exclude(Exists(earlier))
+            .select_related('order')
+            .order_by('available_at', 'id')[:batch_size]
+        )
+        if events:
+            OrderEvent.objects.filter(id__in=[event.id for event in events]).update(
+                available_at=now + timedelta(seconds=settings.ORDER_OUTBOX_LEASE)
+            )
+    return events
+
+
+def backoff_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=settings.ORDER_OUTBOX_BACKOFF * 2 ** (attempts - 1))
+
+
+def deliver_event(event: OrderEvent) -> bool:
+    """
+    Hand the event to every observer that has not handled it yet. Failed
+    observers are retried with exponential backoff; after
+    ORDER_OUTBOX_MAX_ATTEMPTS the event is dead-lettered. Returns True when
+    every observer succeeded.
+    """
+    delivered, errors = get_order_notifier().deliver(
+        event.order, event.event_type, skip=event.delivered_to, **event.payload
+    )
+    event.delivered_to = list(event.delivered_to) + delivered
+    now = timezone.now()
+    if not errors:
+        event.status = OrderEvent.DONE
+        event.processed_at = now
+        event.last_error = ''
+    else:
+        event.attempts += 1
+        event.last_error = '\n'.join(f'{name}: {error!r}' for name, error in errors.items())
+        if event.attempts >= settings.ORDER_OUTBOX_MAX_ATTEMPTS:
+            event.status = OrderEvent.DEAD
+            event.processed_at = now
+        else:
+            event.available_at = now + backoff_delay(event.attempts)
+    event.save(update_fields=['delivered_to', 'status', 'attempts', 'available_at', 'last_error',
+                              'processed_at'])
+    return not errors
+
+
+def _deliver_in_thread(event: OrderEvent) -> bool:
+    try:
+        return deliver_event(event)
+    finally:
+        connections.close_all()
+
+
+def process_batch(events: list, executor: Optional[ThreadPoolExecutor] = None) -> int:
+    """Deliver claimed events, in parallel when given an executor. Returns how many fully succeeded."""
+    if executor is None:
+        return sum(deliver_event(event) for event in events)
+    return sum(executor.map(_deliver_in_thread, events))
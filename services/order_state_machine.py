@@ -1,12 +1,52 @@
 from abc import ABC, abstractmethod
-from orders.models import Order
-from .notification_service import get_order_notifier
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from orders.models import Order, OrderTransition
+from .order_outbox import publish_order_event, publish_order_events
+
+ACTIONS = ('process_next_step', 'cancel_order')
+
+
+class StaleOrderStateError(Exception):
+    """The order left the status a transition was decided from before it could be applied."""
 
 
 class OrderState(ABC):
+    # Where process_next_step / cancel_order lead and the event they emit; None where not allowed.
+    next_status: Optional[str] = None
+    cancel_status: Optional[str] = None
+    cancel_event: str = 'status_changed'
+
     def __init__(self, order: Order):
         self.order = order
 
+    @classmethod
+    def target(cls, action: str) -> Tuple[Optional[str], str]:
+        """(status reached, event type) for ``action`` taken in this state."""
+        if action == 'process_next_step':
+            return cls.next_status, 'status_changed'
+        return cls.cancel_status, cls.cancel_event
+
+    def _transition(self, status: str, event_type: str = 'status_changed', **payload):
+        # Compare-and-swap on the status this state was built from: no row lock, and a
+        # concurrent change makes the UPDATE match nothing. The new status, its log
+        # entry and its outbox event commit together; observers run in run_order_worker.
+        previous_status = self.order.status
+        now = timezone.now()
+        with transaction.atomic():
+            if not Order.objects.filter(pk=self.order.pk, status=previous_status).update(
+                    status=status, updated_at=now):
+                raise StaleOrderStateError(f"Order {self.order.id} is no longer {previous_status}.")
+            self.order.status, self.order.updated_at = status, now
+            OrderTransition.objects.create(order=self.order, from_status=previous_status, to_status=status,
+                                           created_at=now)
+            publish_order_event(self.order, event_type, previous_status=previous_status, **payload)
+
     @abstractmethod
     def process_next_step(self):  # Перейти к следующему логическому состоянию
         pass
@@ -17,48 +57,42 @@ class OrderState(ABC):
 
 
 class NewOrderState(OrderState):
+    next_status = 'PROCESSING'
+    cancel_status = 'CANCELED'
+    cancel_event = 'canceled_with_stock_return'
+
     def process_next_step(self):
         print(f"Order {self.order.id}: Processing payment and moving to 'PROCESSING'.")
-        self.order.status = 'PROCESSING'
-        self.order.save(update_fields=['status'])
-        notifier = get_order_notifier()
-        notifier.notify(self.order, 'status_changed', previous_status='NEW')
+        self._transition(self.next_status)
 
     def cancel_order(self):
         print(f"Order {self.order.id}: Canceling new order.")
-        self.order.status = 'CANCELED'
-        self.order.save(update_fields=['status'])
-        notifier = get_order_notifier()
         should_return_stock = True
         if should_return_stock:
-            notifier.notify(self.order, 'canceled_with_stock_return')
+            self._transition(self.cancel_status, self.cancel_event)
         else:
-            notifier.notify(self.order, 'status_changed', previous_status='NEW', reason='canceled_no_stock_return')
+            self._transition(self.cancel_status, reason='canceled_no_stock_return')
 
 
 class ProcessingOrderState(OrderState):
+    next_status = 'SHIPPED'
+    cancel_status = 'CANCELED'
+
     def process_next_step(self):
         print(f"Order {self.order.id}: Order processed, moving to 'SHIPPED' (or 'Ready for Pickup').")
-        self.order.status = 'SHIPPED'
-        self.order.save(update_fields=['status'])
-        notifier = get_order_notifier()
-        notifier.notify(self.order, 'status_changed')
+        self._transition(self.next_status)
 
     def cancel_order(self):
         print(f"Order {self.order.id}: Canceling order in processing. (Refund logic would be here)")
-        self.order.status = 'CANCELED'
-        self.order.save(update_fields=['status'])
-        notifier = get_order_notifier()
-        notifier.notify(self.order, 'status_changed')
+        self._transition(self.cancel_status, self.cancel_event)
 
 
 class ShippedOrderState(OrderState):
+    next_status = 'COMPLETED'
+
     def process_next_step(self):
         print(f"Order {self.order.id}: Order delivered/picked up, moving to 'COMPLETED'.")
-        self.order.status = 'COMPLETED'
-        self.order.save(update_fields=['status'])
-        notifier = get_order_notifier()
-        notifier.notify(self.order, 'status_changed')
+        self._transition(self.next_status)
 
     def cancel_order(self):
         print(f"Order {self.order.id}: Cannot cancel a shipped order through this simple flow.")
@@ -80,20 +114,23 @@ class CanceledOrderState(OrderState):
     def cancel_order(self):
         print(f"Order {self.order.id}: Order is already canceled.")
 
+
+STATE_CLASSES = {
+    'NEW': NewOrderState,
+    'PROCESSING': ProcessingOrderState,
+    'SHIPPED': ShippedOrderState,
+    'COMPLETED': CompletedOrderState,
+    'CANCELED': CanceledOrderState,
+}
+
+
 class OrderContext:
     def __init__(self, order: Order):
         self.order = order
         self._state = self._get_state_from_order_status()
 
     def _get_state_from_order_status(self) -> OrderState:
-        status_map = {
-            'NEW': NewOrderState,
-            'PROCESSING': ProcessingOrderState,
-            'SHIPPED': ShippedOrderState,
-            'COMPLETED': CompletedOrderState,
-            'CANCELED': CanceledOrderState,
-        }
-        state_class = status_map.get(self.order.status)
+        state_class = STATE_CLASSES.get(self.order.status)
         if not state_class:
             print(f"Warning: Unknown order status '{self.order.status}'. Defaulting to NewOrderState.")
             return NewOrderState(self.order)
@@ -102,10 +139,70 @@ class OrderContext:
     def refresh_state(self):
         self._state = self._get_state_from_order_status()
 
+    def _apply(self, action: str):
+        try:
+            getattr(self._state, action)()
+        except StaleOrderStateError:
+            self.order.refresh_from_db(fields=['status', 'updated_at'])
+            raise
+        finally:
+            self.refresh_state()
+
     def process_next_step(self):
-        self._state.process_next_step()
-        self.refresh_state()
+        self._apply('process_next_step')
 
     def cancel_order(self):
-        self._state.cancel_order()
-        self.refresh_state()
\ No newline at end of file
+        self._apply('cancel_order')
+
+
+@dataclass
+class BulkTransitionResult:
+    moved: Dict[str, List[int]] = field(default_factory=dict)  # new status -> order ids
+    skipped: Dict[int, str] = field(default_factory=dict)  # order id -> reason
+
+    @property
+    def moved_count(self) -> int:
+        return sum(len(ids) for ids in self.moved.values())
+
+
+def bulk_transition(order_ids: Iterable[int], action: str) -> BulkTransitionResult:
+    """
+    Apply ``action`` ('process_next_step' or 'cancel_order') to many orders.
+    Orders are grouped by current status and each group is moved with one
+    ``UPDATE ... WHERE id IN (...) AND status = <current>``; its outbox events
+    are written with one bulk insert in the same transaction. Orders the
+    action does not apply to, or that changed meanwhile, are reported in
+    ``skipped``.
+    """
+    if action not in ACTIONS:
+        raise ValueError(f"Unknown action {action!r}.")
+    order_ids = set(order_ids)
+    result = BulkTransitionResult()
+    by_status = defaultdict(list)
+    for order_id, status in Order.objects.filter(id__in=order_ids).order_by().values_list('id', 'status'):
+        by_status[status].append(order_id)
+    for order_id in order_ids - {order_id for ids in by_status.values() for order_id in ids}:
+        result.skipped[order_id] = "not found"
+
+    for status, ids in by_status.items():
+        state_class = STATE_CLASSES.get(status)
+        target, event_type = state_class.target(action) if state_class else (None, None)
+        if target is None:
+            result.skipped.update({order_id: f"cannot {action.replace('_', ' ')} from {status}" for order_id in ids})
+            continue
+
+        now = timezone.now()
+        with transaction.atomic():
+            updated = Order.objects.filter(id__in=ids, status=status).update(status=target, updated_at=now)
+            moved = ids if updated == len(ids) else list(
+                Order.objects.filter(id__in=ids, status=target, updated_at=now).values_list('id', flat=True)
+            )
+            OrderTransition.objects.bulk_create([
+                OrderTransition(order_id=order_id, from_status=status, to_status=target, created_at=now)
+                for order_id in moved
+            ])
+            publish_order_events(moved, event_type, status=target, previous_status=status)
+        result.moved.setdefault(target, []).extend(moved)
+        moved = set(moved)
+        result.skipped.update({order_id: "changed concurrently" for order_id in ids if order_id not in moved})
+    return result
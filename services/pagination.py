@@ -0,0 +1,118 @@
+import datetime
+import json
+from functools import reduce
+from operator import or_
+
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder truncates to milliseconds, which would break seeks on timestamps.
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class _CursorSerializer:
+    def dumps(self, obj):
+        return json.dumps(obj, cls=_CursorEncoder, separators=(',', ':')).encode('latin-1')
+
+    def loads(self, data):
+        return json.loads(data.decode('latin-1'))
+
+
+class KeysetPage:
+    def __init__(self, object_list: list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a unique ordering such as ``('name', 'id')`` or
+    ``('-created_at', '-id')``. Every page is a ``WHERE (key) > (cursor) LIMIT n``
+    range scan, so deep pages cost the same as the first one.
+    Cursors are signed so clients cannot forge arbitrary filter values.
+    """
+
+    def __init__(self, queryset: QuerySet, ordering, per_page: int, salt: str = 'keyset'):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.salt = salt
+        self._fields = [name.lstrip('-') for name in self.ordering]
+        self._descending = [name.startswith('-') for name in self.ordering]
+
+    def _encode(self, direction: str, obj) -> str:
+        values = [getattr(obj, name) for name in self._fields]
+        return signing.dumps([direction, values], salt=self.salt, serializer=_CursorSerializer, compress=True)
+
+    def _decode(self, cursor: str):
+        try:
+            direction, values = signing.loads(cursor, salt=self.salt, serializer=_CursorSerializer)
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        if direction not in ('next', 'prev') or len(values) != len(self._fields):
+            return None
+        model_meta = self.queryset.model._meta
+        return direction, [model_meta.get_field(name).to_python(value)
+                           for name, value in zip(self._fields, values)]
+
+    def _seek(self, values, forward: bool) -> Q:
+        # (a, b) > (x, y)  ==  a > x OR (a = x AND b > y), with per-field direction.
+        clauses = []
+        for i, name in enumerate(self._fields):
+            ascending = forward != self._descending[i]
+            clause = Q(**{f'{name}__{"gt" if ascending else "lt"}': values[i]})
+            for prev_name, prev_value in zip(self._fields[:i], values[:i]):
+                clause &= Q(**{prev_name: prev_value})
+            clauses.append(clause)
+        return reduce(or_, clauses)
+
+    def get_page(self, cursor: str = None) -> KeysetPage:
+        decoded = self._decode(cursor) if cursor else None
+        qs = self.queryset
+
+        if decoded is None:
+            rows = list(qs.order_by(*self.ordering)[:self.per_page + 1])
+            has_more, has_before = len(rows) > self.per_page, False
+            rows = rows[:self.per_page]
+        elif decoded[0] == 'next':
+            rows = list(qs.filter(self._seek(decoded[1], True)).order_by(*self.ordering)[:self.per_page + 1])
+            has_more, has_before = len(rows) > self.per_page, True
+            rows = rows[:self.per_page]
+        else:
+            reverse_ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+            rows = list(qs.filter(self._seek(decoded[1], False)).order_by(*reverse_ordering)[:self.per_page + 1])
+            has_more, has_before = True, len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+
+        if not rows:
+            return KeysetPage([])
+        return KeysetPage(
+            rows,
+            next_cursor=self._encode('next', rows[-1]) if has_more else None,
+            previous_cursor=self._encode('prev', rows[0]) if has_before else None,
+        )
@@ -0,0 +1,104 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+
+from catalog.models import Product
+
+# Keyed by id alone, so a write evicts only the products it changed; see
+# invalidate_products, which catalog.signals runs once the write commits.
+PRODUCT_KEY = 'catalog:product:{product_id}'
+
+
+class LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# In-process tier, consulted before any I/O. Entries are kept for at most
+# PRODUCT_CACHE_LRU_TTL seconds, which bounds how long a process can serve a
+# product changed by another process.
+_local = LRUCache(settings.PRODUCT_CACHE_LRU_SIZE)
+
+
+def get_products(product_ids: Iterable[int]) -> dict:
+    """
+    Products by id via the in-process LRU, then Django's cache with one get_many,
+    then one ``id IN (...)`` query for whatever is left. Missing ids are omitted.
+    Returned instances are copies and safe to modify.
+    """
+    product_ids = {int(pk) for pk in product_ids}
+    now = time.monotonic()
+    expires = now + settings.PRODUCT_CACHE_LRU_TTL
+    found = {}
+
+    for pk in product_ids:
+        entry = _local.get(pk)
+        if entry is not None and entry[0] > now:
+            found[pk] = entry[1]
+
+    missing = product_ids - found.keys()
+    if missing:
+        keys = {PRODUCT_KEY.format(product_id=pk): pk for pk in missing}
+        for key, product in cache.get_many(keys.keys()).items():
+            found[keys[key]] = product
+            _local.set(keys[key], (expires, product))
+
+    missing = product_ids - found.keys()
+    if missing:
+        loaded = Product.objects.in_bulk(missing)
+        cache.set_many({PRODUCT_KEY.format(product_id=pk): p for pk, p in loaded.items()},
+                       settings.PRODUCT_CACHE_TIMEOUT)
+        for pk, product in loaded.items():
+            found[pk] = product
+            _local.set(pk, (expires, product))
+
+    return {pk: copy.copy(product) for pk, product in found.items()}
+
+
+def get_product(product_id: int) -> Optional[Product]:
+    return get_products([product_id]).get(int(product_id))
+
+
+def get_product_or_404(product_id: int) -> Product:
+    product = get_product(product_id)
+    if product is None:
+        raise Http404("No Product matches the given query.")
+    return product
+
+
+def invalidate_products(product_ids: Iterable[int]) -> None:
+    """Drop the products from both tiers; other products stay cached."""
+    product_ids = list(product_ids)
+    cache.delete_many([PRODUCT_KEY.format(product_id=pk) for pk in product_ids])
+    for pk in product_ids:
+        _local.pop(pk)
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .category_tree import get_category_tree_version
+
+CARD_TEMPLATE = 'catalog/product/_card.html'
+CARD_KEY = 'catalog:card:{product_id}:{updated}:{category_version}'
+CARD_STATS_KEYS = {'hits': 'catalog:card:stats:hits', 'misses': 'catalog:card:stats:misses'}
+# Cached cards never contain a real CSRF token; it is swapped in per request.
+# Product text in a card is HTML-escaped, so it can never contain a raw "<"
+# and cannot be mistaken for the placeholder.
+CSRF_PLACEHOLDER = '<csrf-token/>'
+
+
+def card_cache_key(product, category_version: int) -> str:
+    return CARD_KEY.format(
+        product_id=product.pk,
+        updated=int(product.updated_at.timestamp() * 1_000_000),
+        category_version=category_version,
+    )
+
+
+def _count(name: str, amount: int) -> None:
+    if not amount:
+        return
+    key = CARD_STATS_KEYS[name]
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        if not cache.add(key, amount, None):
+            cache.incr(key, amount)
+
+
+def get_card_cache_stats() -> dict:
+    """Card hits and misses counted by render_product_cards, and the share of hits."""
+    values = cache.get_many(CARD_STATS_KEYS.values())
+    hits = values.get(CARD_STATS_KEYS['hits'], 0)
+    misses = values.get(CARD_STATS_KEYS['misses'], 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
+
+
+def reset_card_cache_stats() -> None:
+    cache.delete_many(CARD_STATS_KEYS.values())
+
+
+def render_product_cards(request, products) -> str:
+    """
+    Concatenated card HTML for ``products``. Cards are fetched with one get_many,
+    only the misses are rendered, and the request's CSRF token is injected last.
+    """
+    category_version = get_category_tree_version()
+    keyed = {card_cache_key(product, category_version): product for product in products}
+    cards = cache.get_many(keyed.keys())
+    hits = len(cards)
+
+    rendered = {
+        key: render_to_string(CARD_TEMPLATE, {'product': product, 'csrf_placeholder': mark_safe(CSRF_PLACEHOLDER)})
+        for key, product in keyed.items() if key not in cards
+    }
+    if rendered:
+        cache.set_many(rendered, settings.PRODUCT_CARD_CACHE_TIMEOUT)
+        cards.update(rendered)
+
+    _count('hits', hits)
+    _count('misses', len(rendered))
+
+    html = ''.join(cards[key] for key in keyed)
+    return mark_safe(html.replace(CSRF_PLACEHOLDER, escape(get_token(request))))
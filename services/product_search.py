@@ -0,0 +1,135 @@
+import re
+
+from django.db import connection, transaction
+
+from catalog.models import Category, Product, CATEGORY_PATH_SEPARATOR
+
+SEARCH_TABLE = 'catalog_product_fts'
+# bm25 column weights for (name, description, category_path): a hit in the name ranks highest.
+BM25_WEIGHTS = (10.0, 1.0, 4.0)
+MAX_QUERY_TERMS = 8
+# Deepest result page served; OFFSET grows with the page and absurd values overflow SQLite integers.
+MAX_PAGE = 100
+INDEX_BATCH_SIZE = 1000
+
+
+def is_search_available() -> bool:
+    return connection.vendor == 'sqlite'
+
+
+def build_match_expression(query: str) -> str:
+    """
+    Turn free text into an FTS5 expression: every word must match as a prefix.
+    Quoting each term keeps user input from being parsed as FTS5 syntax.
+    """
+    terms = re.findall(r'\w+', query.lower())[:MAX_QUERY_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _category_paths(category_ids) -> dict:
+    """Map category id -> "Bread Rye Dark" using one query for all needed ancestors."""
+    categories = Category.objects.filter(id__in=set(category_ids)).values_list('id', 'path')
+    ancestor_paths = {pk: [int(a) for a in path.split(CATEGORY_PATH_SEPARATOR) if a] for pk, path in categories}
+    all_ids = {a for ids in ancestor_paths.values() for a in ids}
+    names = dict(Category.objects.filter(id__in=all_ids).values_list('id', 'name'))
+    return {pk: ' '.join(names.get(a, '') for a in ids) for pk, ids in ancestor_paths.items()}
+
+
+def index_products(product_ids) -> None:
+    if not is_search_available():
+        return
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), INDEX_BATCH_SIZE):
+        batch = product_ids[start:start + INDEX_BATCH_SIZE]
+        rows = list(Product.objects.filter(id__in=batch).values_list('id', 'name', 'description', 'category_id'))
+        paths = _category_paths(row[3] for row in rows)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(pk,) for pk in batch])
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, name, description, category_path) VALUES (%s, %s, %s, %s)',
+                [(pk, name, description, paths.get(category_id, ''))
+                 for pk, name, description, category_id in rows]
+            )
+
+
+def remove_products(product_ids) -> None:
+    if not is_search_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(pk,) for pk in product_ids])
+
+
+def rebuild_index() -> int:
+    if not is_search_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+    product_ids = list(Product.objects.order_by().values_list('id', flat=True))
+    index_products(product_ids)
+    return len(product_ids)
+
+
+def search_product_ids(query: str, limit: int, offset: int = 0, available_only: bool = True) -> list:
+    """
+    Product ids matching ``query``, best bm25 score first.
+    """
+    expression = build_match_expression(query)
+    if not expression:
+        return []
+
+    if not is_search_available():
+        qs = Product.objects.filter(name__icontains=query.strip())
+        if available_only:
+            qs = qs.filter(available=True)
+        return list(qs.values_list('id', flat=True)[offset:offset + limit])
+
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    availability = 'AND p.available = 1' if available_only else ''
+    sql = (
+        f'SELECT {SEARCH_TABLE}.rowid FROM {SEARCH_TABLE} '
+        f'JOIN catalog_product p ON p.id = {SEARCH_TABLE}.rowid '
+        f'WHERE {SEARCH_TABLE} MATCH %s {availability} '
+        f'ORDER BY bm25({SEARCH_TABLE}, {weights}), {SEARCH_TABLE}.rowid '
+        f'LIMIT %s OFFSET %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [expression, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+class SearchPage:
+    def __init__(self, products: list, number: int, has_next: bool):
+        self.object_list = products
+        self.number = number
+        self.has_next = has_next
+        self.has_previous = number > 1
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_page_number(self):
+        return self.number + 1
+
+    @property
+    def previous_page_number(self):
+        return self.number - 1
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def search_products(query: str, page: int = 1, per_page: int = 24) -> SearchPage:
+    """One page of results; pages outside 1..MAX_PAGE fall back to the first."""
+    if not 1 <= page <= MAX_PAGE:
+        page = 1
+    ids = search_product_ids(query, limit=per_page + 1, offset=(page - 1) * per_page)
+    # Nothing past MAX_PAGE is served, so never link to it.
+    has_next = len(ids) > per_page and page < MAX_PAGE
+    ids = ids[:per_page]
+    products = Product.objects.in_bulk(ids)
+    return SearchPage([products[pk] for pk in ids if pk in products], page, has_next)
@@ -0,0 +1,148 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import ROUND_DOWN, Decimal
+from typing import Dict, Iterable, List, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from orders.models import DailySales, HourlySales, Order, OrderItem, SalesRollup
+
+METRICS = ('orders', 'units', 'gross', 'discount', 'net')
+CENT = Decimal('0.01')
+_PERIOD_FIELD = {DailySales: 'day', HourlySales: 'hour'}
+
+
+def _split(amount: Decimal, weights: List[Decimal]) -> List[Decimal]:
+    """``amount`` shared out in proportion to ``weights``; the last share takes the rounding."""
+    total = sum(weights)
+    shares = []
+    for weight in weights[:-1]:
+        shares.append((amount * weight / total).quantize(CENT, ROUND_DOWN) if total else Decimal('0.00'))
+    shares.append(amount - sum(shares))
+    return shares
+
+
+def _periods(created_at: datetime) -> dict:
+    local = timezone.localtime(created_at)
+    return {DailySales: local.date(), HourlySales: local.replace(minute=0, second=0, microsecond=0)}
+
+
+def _deltas(signs: Dict[int, int]) -> dict:
+    """
+    ``{(model, dimension, period, key): [orders, units, gross, discount, net]}``
+    adding (sign 1) or removing (sign -1) each order in ``{order_id: sign}``.
+    The order-level discount is shared between its products by their gross;
+    an order without items only counts as an order in the TOTAL dimension.
+    """
+    orders = {pk: (created_at, total) for pk, created_at, total in Order.objects.filter(
+        pk__in=signs).values_list('pk', 'created_at', 'final_total_price')}
+    products = defaultdict(dict)  # order id -> product id -> [category id, units, gross]
+    # Items keep the category they were sold in; ones created without it fall back to the product's.
+    for order_id, product_id, category_id, price, quantity in OrderItem.objects.filter(
+            order_id__in=signs).values_list('order_id', 'product_id',
+                                            Coalesce('category_id', 'product__category_id'), 'price', 'quantity'):
+        line = products[order_id].setdefault(product_id, [category_id, 0, Decimal('0.00')])
+        line[1] += quantity
+        line[2] += price * quantity
+
+    deltas = defaultdict(lambda: [0, 0, Decimal('0.00'), Decimal('0.00'), Decimal('0.00')])
+    for order_id, (created_at, final_total) in orders.items():
+        sign = signs[order_id]
+        lines = products.get(order_id, {})
+        gross_total = sum(gross for _, _, gross in lines.values())
+        discounts = _split(min(max(gross_total - final_total, Decimal('0.00')), gross_total),
+                           [gross for _, _, gross in lines.values()])
+        for model, period in _periods(created_at).items():
+            deltas[model, SalesRollup.TOTAL, period, 0][0] += sign
+            counted = {(SalesRollup.TOTAL, 0)}
+            for (product_id, (category_id, units, gross)), discount in zip(lines.items(), discounts):
+                for dimension, key in ((SalesRollup.TOTAL, 0), (SalesRollup.CATEGORY, category_id),
+                                       (SalesRollup.PRODUCT, product_id)):
+                    row = deltas[model, dimension, period, key]
+                    if (dimension, key) not in counted:
+                        counted.add((dimension, key))
+                        row[0] += sign
+                    row[1] += sign * units
+                    row[2] += sign * gross
+                    row[3] += sign * discount
+                    row[4] += sign * (gross - discount)
+    return deltas
+
+
+def _apply(deltas: dict) -> None:
+    # A fixed row order keeps concurrent writers from deadlocking on each other's rows.
+    for (model, dimension, period, key), values in sorted(
+            deltas.items(), key=lambda item: (item[0][0]._meta.model_name,) + item[0][1:]):
+        lookup = {'dimension': dimension, _PERIOD_FIELD[model]: period, 'key': key}
+        changes = dict(zip(METRICS, values))
+        increments = {field: F(field) + value for field, value in changes.items()}
+        if model.objects.filter(**lookup).update(**increments):
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(**lookup, **changes)
+        except IntegrityError:
+            # Another writer created the row since the update above.
+            model.objects.filter(**lookup).update(**increments)
+
+
+@transaction.atomic
+def sync_order_sales(order_ids: Iterable[int]) -> Tuple[int, int]:
+    """
+    Bring the rollups in line with the orders' current status: count the
+    orders that are not canceled and not counted yet, and take canceled
+    orders back out. Only orders whose ``counted_in_sales`` flag this call
+    flips are applied, so it is safe to repeat (outbox retries, backfills)
+    and to run concurrently. Returns ``(added, removed)``.
+    """
+    orders = Order.objects.select_for_update().filter(pk__in=list(order_ids))
+    added = list(orders.filter(counted_in_sales=False).exclude(status='CANCELED').values_list('pk', flat=True))
+    removed = list(orders.filter(counted_in_sales=True, status='CANCELED').values_list('pk', flat=True))
+    if not added and not removed:
+        return 0, 0
+
+    Order.objects.filter(pk__in=added).update(counted_in_sales=True)
+    Order.objects.filter(pk__in=removed).update(counted_in_sales=False)
+    _apply(_deltas({**dict.fromkeys(added, 1), **dict.fromkeys(removed, -1)}))
+    return len(added), len(removed)
+
+
+@transaction.atomic
+def reset_sales_rollups() -> None:
+    """Empty the rollups and mark every order uncounted, ready for a backfill."""
+    DailySales.objects.all().delete()
+    HourlySales.objects.all().delete()
+    Order.objects.filter(counted_in_sales=True).update(counted_in_sales=False)
+
+
+def _start_of_day(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _rollups(dimension: str, date_from: date, date_to: date, hourly: bool = False):
+    if hourly:
+        return HourlySales.objects.filter(dimension=dimension, hour__gte=_start_of_day(date_from),
+                                          hour__lt=_start_of_day(date_to + timedelta(days=1)))
+    return DailySales.objects.filter(dimension=dimension, day__gte=date_from, day__lte=date_to)
+
+
+def sales_by_period(dimension: str, date_from: date, date_to: date, hourly: bool = False) -> list:
+    """
+    One dict per period and key between the two days (inclusive), read from
+    the rollups alone, so the cost grows with the days covered and not
+    with the number of orders.
+    """
+    period = 'hour' if hourly else 'day'
+    return list(_rollups(dimension, date_from, date_to, hourly).order_by(period, 'key')
+                .values(period, 'key', *METRICS))
+
+
+def sales_totals(dimension: str, date_from: date, date_to: date) -> list:
+    """Per key totals over the days, best selling (by net) first."""
+    return list(
+        _rollups(dimension, date_from, date_to).order_by().values('key')
+        .annotate(**{field: Sum(field) for field in METRICS}).order_by('-net', 'key')
+    )